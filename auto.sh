@@ -45,9 +45,8 @@ for size in "${sizes[@]}"; do
     png_file="${FOLDER}/${png_filename}"
 
     echo "Processing ${size}..."
-    uv run python -m papr.papr "${LAYOUT}" -y "${YEAR}" -p "${size}" -m "${MONTH}" -l "${LOCALE}" -o "${pdf_file}" --font "${FONT}" && \
-    uv run python -m papr.papr "${LAYOUT}" -y "${YEAR}" -p "${size}" -m "${MONTH}" -l "${LOCALE}" -o "${svg_file}" --font "${FONT}"
-    magick -density 300 "${pdf_file}" -background white -alpha remove -alpha off "${png_file}"
+    uv run python -m papr.papr "${LAYOUT}" -y "${YEAR}" -p "${size}" -m "${MONTH}" -l "${LOCALE}" --font "${FONT}" \
+        -o "${pdf_file}" -o "${svg_file}" -o "${png_file}" --dpi 300
 
     # Add entry to JSON array
     json_entries+=("{\"id\":\"${size}\",\"name\":\"${size}\",\"size\":\"${size}\",\"layout\":\"${LAYOUT}\",\"font\":\"${FONT}\",\"year\":${YEAR},\"month\":${MONTH},\"locale\":\"${LOCALE}\",\"png\":\"${png_filename}\",\"pdf\":\"${pdf_filename}\",\"svg\":\"${svg_filename}\"}")
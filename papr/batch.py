@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Batch mode: render a whole year x month x layout x font x locale x paper
+matrix in a single process and write the product.json manifest.
+Builds are incremental, outputs whose inputs didn't change are skipped.
+Usage: papr batch [options] LAYOUT [LAYOUT ...]
+"""
+
+import os
+import sys
+import glob
+import json
+import hashlib
+import argparse
+import datetime
+import itertools
+import locale
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from papr import papr
+from papr import fonts
+from papr import layouts
+from papr.util import names
+
+
+MANIFEST = "product.json"
+
+# records the input hash of every output, to rebuild only stale outputs
+BUILD_MANIFEST = ".papr-build.json"
+
+
+def sanitize_font(font):
+    """Remove spaces from a font name for use in file names."""
+    return font.replace(" ", "")
+
+
+def sanitize_locale(name):
+    """Replace special chars in a locale name with hyphens, e.g. en_US -> EN-US."""
+    return name.replace("_", "-").replace(".", "-").upper()
+
+
+def expand(args):
+    """Expand the command line axes into a list of jobs, one per combination."""
+    jobs = []
+    for year, month, layout, font, locale_name, size in itertools.product(
+            args.years, args.months, args.layouts, args.fonts, args.locales, args.papers):
+        base_name = "%s-%s-%s-%s-%s-%s" % (layout, year, month, sanitize_font(font),
+                                           sanitize_locale(locale_name), size)
+        jobs.append({
+            "base_name": base_name,
+            "out_dir": args.out,
+            "formats": args.formats,
+            "options": {
+                "layout": layout,
+                "year": year,
+                "month": month,
+                "fonts": [font],
+                "locale": locale_name,
+                "paper": size,
+                "dpi": args.dpi,
+                "grayscale": args.grayscale,
+            },
+        })
+    return jobs
+
+
+def manifest_entry(job):
+    """Return the product.json entry of a job."""
+    options = job["options"]
+    entry = {
+        "id": job["base_name"],
+        "name": job["base_name"],
+        "size": options["paper"],
+        "layout": options["layout"],
+        "font": options["fonts"][0],
+        "year": options["year"],
+        "month": options["month"],
+        "locale": options["locale"],
+    }
+    for fmt in job["formats"]:
+        entry[fmt] = "%s.%s" % (job["base_name"], fmt)
+    return entry
+
+
+def run(job):
+    """Render the stale formats of a single job and return its base name."""
+    options = job["options"]
+    # draw once, write every format from the same recording
+    document = papr.render_document(options)
+    for fmt in job["stale"]:
+        filename = "%s.%s" % (job["base_name"], fmt)
+        document.write(os.path.join(job["out_dir"], filename), fmt,
+                       options["dpi"], options["grayscale"])
+    return job["base_name"]
+
+
+def digest(paths):
+    """Hash the contents of the given source files."""
+    sha = hashlib.sha256()
+    for path in sorted(paths):
+        sha.update(path.encode("utf-8"))
+        with open(path, "rb") as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+class InputHasher(object):
+    """
+    Computes the input hash of an output file from the normalized options,
+    the layout module source, papr.py, the util modules and the resolved
+    font files.
+    Digests of sources and fonts are computed once per batch.
+    """
+
+    def __init__(self):
+        util_dir = os.path.join(os.path.dirname(os.path.abspath(papr.__file__)), "util")
+        # papr.py holds the paper sizes, setup() and draw()
+        self.util_digest = digest(glob.glob(os.path.join(util_dir, "*.py")) +
+                                  [os.path.abspath(papr.__file__)])
+        self._layouts = {}
+        self._fonts = {}
+
+    def layout_digest(self, name):
+        if name not in self._layouts:
+            source = getattr(layouts.load(name), "__file__", None)
+            self._layouts[name] = digest([source]) if source else name
+        return self._layouts[name]
+
+    def font_digest(self, family):
+        if family not in self._fonts:
+            sha = hashlib.sha256(family.encode("utf-8"))
+            for path in fonts.font_files(family):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                sha.update(("%s:%s:%s" % (path, stat.st_size, stat.st_mtime)).encode("utf-8"))
+            self._fonts[family] = sha.hexdigest()
+        return self._fonts[family]
+
+    def output_hash(self, options, fmt):
+        normalized = papr.normalize(dict(options, format=fmt))
+        # banding changes how PNG output is produced, not its pixels
+        normalized.pop("tile_rows")
+        normalized.pop("tile_jobs")
+        if fmt != "png":
+            # raster settings don't change vector outputs
+            normalized.pop("dpi")
+            normalized.pop("grayscale")
+        inputs = {
+            "options": normalized,
+            "layout": self.layout_digest(normalized["layout"]),
+            "util": self.util_digest,
+            "fonts": [self.font_digest(family) for family in normalized["fonts"]],
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_build_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def plan(jobs, build, force=False):
+    """
+    Determine the stale formats of every job and record their new input hashes.
+
+    Sets job["stale"] to the formats which have to be rendered and
+    job["hashes"] to the input hash of every output file.
+    """
+    hasher = InputHasher()
+    for job in jobs:
+        job["hashes"] = {}
+        job["stale"] = []
+        for fmt in job["formats"]:
+            filename = "%s.%s" % (job["base_name"], fmt)
+            input_hash = hasher.output_hash(job["options"], fmt)
+            job["hashes"][filename] = input_hash
+            up_to_date = (build.get(filename) == input_hash and
+                          os.path.exists(os.path.join(job["out_dir"], filename)))
+            if force or not up_to_date:
+                job["stale"].append(fmt)
+    return jobs
+
+
+def write_manifest(path, entries):
+    with open(path, "w") as f:
+        json.dump(entries, f, indent=2)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="papr batch",
+                                     description='Render every combination of the given options in one process')
+
+    td = datetime.date.today()
+    parser.add_argument("-y", "--years", type=int, nargs="+", metavar="YEAR",
+                        help="years to render, default is the current year (" + str(td.year) + ").", default=[td.year])
+
+    parser.add_argument("-m", "--months", type=int, nargs="+", choices=range(1, 13), metavar="MONTH",
+                        help="starting months to render (1-12), default is the current month (" + str(td.month) + ").", default=[td.month])
+
+    parser.add_argument("-f", "--fonts", nargs="+", metavar="FONT",
+                        help="font families to render, one calendar per family, default is Sans", default=None)
+
+    parser.add_argument("-l", "--locales", nargs="+", metavar="LOCALE",
+                        help="locales to render (check 'locale -a' for available locales)", default=["en_US"])
+
+    parser.add_argument("-p", "--papers", nargs="+", choices=papr.PAPER_NAMES, metavar="PAPER",
+                        help="paper sizes to render " + str(papr.PAPER_NAMES), default=["A4"])
+
+    parser.add_argument("--formats", nargs="+", choices=papr.FORMATS,
+                        help="output formats to render for every combination", default=["pdf", "svg", "png"])
+
+    parser.add_argument("--dpi", type=int,
+                        help="resolution of PNG output, default is 300", default=300)
+
+    parser.add_argument("--grayscale", action="store_true",
+                        help="write PNG output as 8 bit grayscale", default=False)
+
+    parser.add_argument("-o", "--out", default="out",
+                        help="output folder, " + MANIFEST + " is written into it as well")
+
+    parser.add_argument("--force", action="store_true",
+                        help="render all combinations, even if their outputs are up to date", default=False)
+
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of workers, default is 1 (render in this process)")
+
+    parser.add_argument("--threads", action="store_true",
+                        help="run the workers as threads of this process instead of separate processes", default=False)
+
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="print status messages to stdout", default=False)
+
+    parser.add_argument("-d", "--debug", action="store_true",
+                        help="print status and debug messages to stdout", default=False)
+
+    parser.add_argument("layouts", nargs="+", metavar="LAYOUT",
+                        help="calendar layouts to render: " + str(tuple(layouts.BUILTIN)) + " or installed plugins")
+    args = parser.parse_args(argv)
+
+    for name in args.layouts:
+        if not layouts.known(name):
+            parser.error("argument LAYOUT: " + layouts.unknown_message(name))
+
+    if args.dpi < 1:
+        parser.error("argument --dpi: must be at least 1")
+
+    # check every font and locale up front, instead of rendering with a
+    # fallback font or failing halfway through the matrix
+    if args.fonts is None:
+        args.fonts = ['Sans']
+    else:
+        unknown = fonts.missing(args.fonts)
+        if unknown:
+            parser.error("argument -f/--fonts: font(s) not installed: %s (list installed fonts with 'papr fonts')"
+                         % ", ".join(repr(f) for f in unknown))
+    for locale_name in args.locales:
+        try:
+            names.for_locale(locale_name)
+        except locale.Error:
+            parser.error("argument -l/--locales: locale %r not found (check 'locale -a' for available locales)"
+                         % locale_name)
+
+    if(args.debug):
+        logging.basicConfig(format='%(message)s', level=logging.DEBUG)
+    elif(args.verbose):
+        logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+    os.makedirs(args.out, exist_ok=True)
+    jobs = expand(args)
+    total = len(jobs)
+
+    build_path = os.path.join(args.out, BUILD_MANIFEST)
+    build = load_build_manifest(build_path)
+    plan(jobs, build, args.force)
+    stale = [job for job in jobs if job["stale"]]
+    logging.info("Processing %s of %s combinations with %s job(s), %s up to date...",
+                 len(stale), total, args.jobs, total - len(stale))
+
+    # record finished outputs even if a later combination fails
+    try:
+        if args.jobs > 1:
+            pool = ThreadPoolExecutor if args.threads else ProcessPoolExecutor
+            with pool(max_workers=args.jobs) as executor:
+                for current, (job, name) in enumerate(zip(stale, executor.map(run, stale)), 1):
+                    logging.info("[%s/%s] Finished: %s", current, len(stale), name)
+                    build.update(job["hashes"])
+        else:
+            for current, job in enumerate(stale, 1):
+                logging.info("[%s/%s] Processing: %s...", current, len(stale), job["base_name"])
+                run(job)
+                build.update(job["hashes"])
+    finally:
+        write_manifest(build_path, build)
+
+    entries = [manifest_entry(job) for job in jobs]
+    write_manifest(os.path.join(args.out, MANIFEST), entries)
+    logging.info("All %s combinations up to date, %s written to %s/", total, MANIFEST, args.out)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of every layout, paper size and output format.
+Usage: python -m papr.bench [-l LAYOUT ...] [-p PAPER ...] [--formats FORMAT ...]
+                            [-o bench.json] [--baseline baseline.json]
+
+Every case is rendered in a fresh interpreter, so its peak RSS is not
+inflated by the cases before it. Each case records the best wall time of
+`--repeat` renders (geometry, locale setup, drawing and writing the output
+into memory), each started with empty geometry and locale caches, the peak
+RSS of its process, the output size and the number of Pango layouts
+created. Results are written as JSON; a previous result file can be passed
+as baseline, cases slower or bigger than the thresholds are reported as
+regressions and make the command exit with status 1.
+"""
+
+import io
+import sys
+import json
+import time
+import argparse
+import logging
+import platform
+import resource
+import subprocess
+
+import papr as package
+from papr import papr
+from papr import layouts
+from papr.util import geometry
+from papr.util import names
+
+LAYOUTS = ("classic", "column", "oneyear", "big", "month")
+PAPERS = ("A5", "A4", "A3", "A2", "A1", "A0", "USLetter", "USLedger")
+
+RESULTS_VERSION = 1
+
+# metric: (command line option, default threshold in percent)
+THRESHOLDS = {
+    "wall_time": ("time_threshold", 10.0),
+    "peak_rss": ("rss_threshold", 10.0),
+    "output_bytes": ("bytes_threshold", 5.0),
+    "pango_layouts": ("layouts_threshold", 0.0),
+}
+
+# wall time differences below this many seconds are noise
+MIN_TIME_DELTA = 0.005
+
+
+def case_name(case):
+    return "%s/%s/%s" % (case["layout"], case["paper"], case["format"])
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform == "darwin":
+        return rss
+    return rss * 1024
+
+
+def run_case(case, repeat):
+    """Render `case` `repeat` times in this process and return its measurements."""
+    options = {
+        "layout": case["layout"],
+        "paper": case["paper"],
+        "format": case["format"],
+        "year": case["year"],
+        "month": case["month"],
+        "fonts": case["fonts"],
+        "dpi": case["dpi"],
+    }
+    times = []
+    for _ in range(repeat):
+        # time every repeat cold, like a fresh render
+        geometry.clear_caches()
+        names.for_locale.cache_clear()
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        document = papr.render_document(options)
+        document.write(buffer, case["format"], case["dpi"])
+        times.append(time.perf_counter() - start)
+
+    result = dict(case)
+    result.update({
+        "wall_time": min(times),
+        "wall_times": times,
+        "peak_rss": peak_rss(),
+        "output_bytes": len(buffer.getvalue()),
+        "pango_layouts": document.stats.get("pango_layouts"),
+    })
+    return result
+
+
+def spawn_case(case, repeat):
+    """Run `case` in a fresh interpreter and return its measurements."""
+    command = [sys.executable, "-m", "papr.bench", "--case", json.dumps(case),
+               "--repeat", str(repeat)]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, check=True)
+    return json.loads(completed.stdout.decode("utf-8"))
+
+
+def cases(args):
+    """Expand the layouts x papers x formats matrix."""
+    return [{
+        "layout": layout,
+        "paper": paper,
+        "format": fmt,
+        "year": args.year,
+        "month": args.month,
+        "fonts": args.fonts,
+        "dpi": args.dpi,
+    } for layout in args.layouts for paper in args.papers for fmt in args.formats]
+
+
+def compare(results, baseline, thresholds):
+    """
+    Compare `results` with the results of `baseline`.
+
+    Args:
+        results: list of case results
+        baseline: list of case results of a previous run
+        thresholds: dict of metric name to allowed increase in percent
+
+    Returns:
+        A list of (case name, metric, baseline value, new value) of every
+        metric above its threshold.
+    """
+    previous = {case_name(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        name = case_name(result)
+        if name not in previous:
+            continue
+        for metric, threshold in thresholds.items():
+            old, new = previous[name].get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            if metric == "wall_time" and new - old < MIN_TIME_DELTA:
+                continue
+            if new > old * (1 + threshold / 100.0):
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def change(old, new):
+    if not old:
+        return ""
+    return "%+.1f%%" % ((new - old) * 100.0 / old)
+
+
+def print_table(results, baseline):
+    previous = {case_name(result): result for result in baseline or []}
+    print("%-28s %10s %8s %10s %8s %12s %8s %8s" % (
+        "case", "time ms", "", "rss MB", "", "bytes", "", "layouts"))
+    for result in results:
+        old = previous.get(case_name(result), {})
+        print("%-28s %10.1f %8s %10.1f %8s %12d %8s %8s" % (
+            case_name(result),
+            result["wall_time"] * 1000, change(old.get("wall_time"), result["wall_time"]),
+            result["peak_rss"] / 1024.0 / 1024.0, change(old.get("peak_rss"), result["peak_rss"]),
+            result["output_bytes"], change(old.get("output_bytes"), result["output_bytes"]),
+            result["pango_layouts"]))
+
+
+def load_results(path):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != RESULTS_VERSION:
+        raise ValueError("%s: unsupported results version %r" % (path, data.get("version")))
+    return data["results"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m papr.bench",
+                                     description='Benchmark papr layouts across paper sizes and output formats')
+
+    parser.add_argument("-l", "--layouts", nargs="+", metavar="LAYOUT",
+                        help="layouts to benchmark, default is " + str(LAYOUTS), default=list(LAYOUTS))
+
+    parser.add_argument("-p", "--papers", nargs="+", choices=papr.PAPER_NAMES, metavar="PAPER",
+                        help="paper sizes to benchmark, default is " + str(PAPERS), default=list(PAPERS))
+
+    parser.add_argument("--formats", nargs="+", choices=papr.FORMATS,
+                        help="output formats to benchmark", default=list(papr.FORMATS))
+
+    parser.add_argument("--dpi", type=int,
+                        help="resolution of PNG output, default is 150", default=150)
+
+    parser.add_argument("-y", "--year", type=int, default=2026,
+                        help="year to render, fixed so results stay comparable, default is 2026")
+
+    parser.add_argument("-m", "--month", type=int, choices=range(1, 13), metavar="MONTH", default=1,
+                        help="starting month to render, default is 1")
+
+    parser.add_argument("-f", "--fonts", nargs="+", metavar="FONT", default=['Sans'],
+                        help="fonts to render with, default is Sans")
+
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="renders per case, the best wall time is recorded, default is 3")
+
+    parser.add_argument("-o", "--out", default="bench.json",
+                        help="file to write the results to, default is bench.json")
+
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="results of a previous run to compare against")
+
+    for metric, (option, default) in sorted(THRESHOLDS.items()):
+        parser.add_argument("--" + option.replace("_", "-"), dest=option, type=float, default=default,
+                            metavar="PCT",
+                            help="allowed increase of %s over the baseline in percent, default is %s"
+                            % (metric, default))
+
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="print status messages to stdout", default=False)
+
+    parser.add_argument("-d", "--debug", action="store_true",
+                        help="print status and debug messages to stdout", default=False)
+
+    # a single case run by spawn_case(), prints its result as JSON
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("argument -r/--repeat: must be at least 1")
+    for name in args.layouts:
+        if not layouts.known(name):
+            parser.error("argument -l/--layouts: " + layouts.unknown_message(name))
+
+    if args.case:
+        json.dump(run_case(json.loads(args.case), args.repeat), sys.stdout)
+        return 0
+
+    if(args.debug):
+        logging.basicConfig(format='%(message)s', level=logging.DEBUG)
+    elif(args.verbose):
+        logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+    baseline = load_results(args.baseline) if args.baseline else None
+
+    todo = cases(args)
+    results = []
+    for current, case in enumerate(todo, 1):
+        logging.info("[%s/%s] %s...", current, len(todo), case_name(case))
+        results.append(spawn_case(case, args.repeat))
+
+    with open(args.out, "w") as f:
+        json.dump({
+            "version": RESULTS_VERSION,
+            "papr": package.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }, f, indent=2)
+
+    print_table(results, baseline)
+    print("results written to %s" % args.out)
+
+    if baseline is None:
+        return 0
+
+    thresholds = {metric: getattr(args, option) for metric, (option, _) in THRESHOLDS.items()}
+    regressions = compare(results, baseline, thresholds)
+    for name, metric, old, new in regressions:
+        print("REGRESSION %s %s: %s -> %s (%s)" % (name, metric, old, new, change(old, new)))
+    if regressions:
+        return 1
+    print("no regressions against %s" % args.baseline)
+    return 0
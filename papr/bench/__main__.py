@@ -0,0 +1,5 @@
+import sys
+
+from papr.bench import main
+
+sys.exit(main())
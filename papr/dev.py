@@ -1,70 +1,218 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import sys
+"""
+Dev mode: watch the papr sources and re-render on every change.
+Usage: python -m papr.dev [--preview] [--preview-out FILE] [--preview-dpi DPI]
+                          [--debounce MS] [same arguments as papr]
+
+One warm process keeps gi, the font map and the layouts loaded. Changed
+layout and util modules are reloaded with importlib.reload and the calendar
+is rendered again in a forked child, so a newer change can cancel a render
+that is still running. Bursts of saves are debounced into one render.
+"""
+
 import os
-import subprocess
+import sys
+import argparse
+import importlib
+import traceback
+import multiprocessing
 from pathlib import Path
 from watchfiles import watch
 
-def main():
+from papr import papr
+from papr import fonts
+from papr import layouts
+
+# packages whose modules are reloaded in place, util before layouts since
+# layouts use util
+RELOADABLE = ("papr.util", "papr.layouts")
+
+# longest time in milliseconds changes are grouped into one render while
+# saves keep coming, watchfiles' default
+MAX_GROUPING = 1600
+
+
+def module_name(path, root):
+    """Module name of the source file `path` below `root`, e.g. papr.layouts.big."""
+    parts = list(Path(path).relative_to(root).with_suffix("").parts)
+    if parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
+
+def reload_changed(paths, root):
     """
-    Dev mode: Watch for file changes and rerun papr command.
-    Usage: papr-dev [same arguments as papr]
+    Reload the changed layout and util modules which are already imported.
+
+    Returns:
+        (reloaded, skipped) module names, skipped modules need a restart
     """
-    # Get the papr source directory
-    papr_dir = Path(__file__).parent
+    names = sorted({module_name(path, root) for path in paths},
+                   key=lambda name: (not name.startswith(RELOADABLE[0]), name))
+    reloaded, skipped = [], []
+    for name in names:
+        if not name.startswith(RELOADABLE):
+            skipped.append(name)
+            continue
+        module = sys.modules.get(name)
+        if module is None:
+            # not imported yet, it will be loaded fresh when used
+            continue
+        importlib.reload(module)
+        reloaded.append(name)
+    if any(name.startswith(RELOADABLE[0]) for name in reloaded):
+        clear_layout_caches()
+    return reloaded, skipped
+
+
+def clear_layout_caches():
+    """
+    Empty the caches of the imported layout modules' functions, e.g. the
+    @geometry.cached page models, which would otherwise keep results
+    computed by the util modules before their reload.
+    """
+    for name, module in list(sys.modules.items()):
+        if module is None or not name.startswith(RELOADABLE[1] + "."):
+            continue
+        for function in vars(module).values():
+            if callable(getattr(function, "cache_clear", None)):
+                function.cache_clear()
+
+
+def render(args):
+    """Render the calendar once with the current modules and report the result."""
+    try:
+        environment = papr.setup(args.environment)
+        document = papr.draw(environment)
+        for out in environment.out:
+            document.write(out, environment.format, environment.dpi, environment.grayscale)
+        if args.preview:
+            document.write(args.preview_out, "png", args.preview_dpi)
+        print("\n✅ Render completed successfully")
+    except Exception:
+        traceback.print_exc()
+        print("\n❌ Render failed")
+
+
+class Renderer(object):
+    """Runs renders in forked children, cancelling the running one on restart."""
+
+    def __init__(self, args):
+        self.args = args
+        self.process = None
+        # fork inherits the warm interpreter, other start methods would
+        # import everything again, then render in this process instead
+        if "fork" in multiprocessing.get_all_start_methods():
+            self.context = multiprocessing.get_context("fork")
+        else:
+            self.context = None
+
+    def cancel(self):
+        """Stop the running render, if any. Returns whether one was running."""
+        if self.process is None or not self.process.is_alive():
+            return False
+        self.process.terminate()
+        self.process.join()
+        return True
 
-    # Get the command arguments (everything after papr-dev)
-    papr_args = sys.argv[1:]
+    def start(self):
+        if self.context is None:
+            render(self.args)
+            return
+        self.process = self.context.Process(target=render, args=(self.args,))
+        self.process.start()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m papr.dev", add_help=False,
+                                     description='Watch the papr sources and re-render on every change')
+    parser.add_argument("--preview", action="store_true", default=False,
+                        help="also write a low resolution PNG preview")
+    parser.add_argument("--preview-out", default="preview.png", metavar="FILE",
+                        help="file of the PNG preview, default is preview.png")
+    parser.add_argument("--preview-dpi", type=int, default=48, metavar="DPI",
+                        help="resolution of the PNG preview, default is 48")
+    parser.add_argument("--debounce", type=int, default=200, metavar="MS",
+                        help="wait for MS milliseconds without changes before rendering, default is 200")
+    args, papr_args = parser.parse_known_args(argv)
+    if args.preview_dpi < 1:
+        parser.error("argument --preview-dpi: must be at least 1")
 
     if not papr_args:
         print("Error: Please provide papr arguments")
-        print("Usage: papr-dev [papr arguments]")
-        print("Example: papr-dev -y 2023 -m 2 -f='Avenir Next' -p A3 oneyear")
+        print("Usage: python -m papr.dev [--preview] [--debounce MS] [papr arguments]")
+        print("Example: python -m papr.dev --preview -y 2023 -m 2 -f='Avenir Next' -p A3 oneyear")
         sys.exit(1)
 
-    # Build the command to run
-    cmd = [sys.executable, "-m", "papr.papr"] + papr_args
+    papr_parser = papr.build_parser()
+    args.environment = papr_parser.parse_args(papr_args)
+    papr.validate(papr_parser, args.environment)
+    args.papr_args = papr_args
+    return args
+
+
+def main(argv=None):
+    """
+    Dev mode: Watch for file changes and re-render in a warm process.
+    Usage: papr-dev [dev options] [same arguments as papr]
+    """
+    # Get the papr source directory
+    papr_dir = Path(__file__).parent
+
+    args = parse_args(sys.argv[1:] if argv is None else argv)
 
     print(f"🔧 Dev mode started")
     print(f"📂 Watching: {papr_dir}")
-    print(f"🚀 Running: papr {' '.join(papr_args)}")
+    print(f"🚀 Running: papr {' '.join(args.papr_args)}")
+    if args.preview:
+        print(f"🖼  Preview: {args.preview_out} at {args.preview_dpi} dpi")
     print("=" * 60)
 
-    def run_command():
-        """Run the papr command"""
-        try:
-            result = subprocess.run(cmd, check=False)
-            if result.returncode == 0:
-                print("\n✅ Command completed successfully")
-            else:
-                print(f"\n❌ Command failed with exit code {result.returncode}")
-        except Exception as e:
-            print(f"\n❌ Error running command: {e}")
-
-    # Run once initially
-    run_command()
+    # warm up once: gi, the font map and the layout stay loaded for every
+    # render after this one
+    fonts.list_families()
+    layouts.load(args.environment.layout)
+    render(args)
+    renderer = Renderer(args)
 
     print("\n👀 Watching for changes... (Press Ctrl+C to stop)")
     print("=" * 60)
 
-    # Watch for changes and rerun
+    # Watch for changes and re-render: watchfiles yields once no change
+    # arrived for `step` ms, `debounce` only caps how long a steady stream
+    # of changes is grouped
     try:
-        for changes in watch(papr_dir, watch_filter=lambda change, path: path.endswith('.py')):
+        for changes in watch(papr_dir, step=args.debounce,
+                             debounce=max(MAX_GROUPING, args.debounce),
+                             watch_filter=lambda change, path: path.endswith('.py')):
+            cancelled = renderer.cancel()
+
             # Clear screen for clean output
             os.system('clear' if os.name == 'posix' else 'cls')
 
-            print("🔄 Files changed, rerunning...")
+            if cancelled:
+                print("⏹  Cancelled the running render")
+            print("🔄 Files changed, re-rendering...")
             for change_type, path in changes:
                 print(f"  {change_type.name}: {Path(path).relative_to(papr_dir.parent)}")
-            print("=" * 60)
 
-            run_command()
-
-            print("\n👀 Watching for changes... (Press Ctrl+C to stop)")
+            try:
+                reloaded, skipped = reload_changed([path for _, path in changes], papr_dir.parent)
+            except Exception:
+                traceback.print_exc()
+                print("\n❌ Reload failed, fix the error and save again")
+                continue
+            for name in reloaded:
+                print(f"  ♻️  reloaded {name}")
+            for name in skipped:
+                print(f"  ⚠️  {name} is not reloaded, restart dev mode to pick it up")
             print("=" * 60)
+
+            renderer.start()
     except KeyboardInterrupt:
+        renderer.cancel()
         print("\n\n👋 Dev mode stopped")
         sys.exit(0)
 
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Installed font families, cached on disk.
+Enumerating every family through the font map is slow on machines with large
+font collections, so the list is cached and only rebuilt when the fontconfig
+cache (or one of the system font folders) changes.
+Usage: papr fonts [--refresh]
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import logging
+import subprocess
+import threading
+
+CACHE_VERSION = 1
+
+# folders whose modification time invalidates the cached family list
+FONT_STAMP_DIRS = (
+    "/var/cache/fontconfig",
+    "/usr/local/var/cache/fontconfig",
+    "/opt/homebrew/var/cache/fontconfig",
+    "~/.cache/fontconfig",
+    "~/.fontconfig",
+    "/Library/Fonts",
+    "/System/Library/Fonts",
+    "~/Library/Fonts",
+)
+
+
+def cache_path():
+    """Location of the family cache, inside $XDG_CACHE_HOME (default ~/.cache)."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "papr", "fonts.json")
+
+
+def cache_key():
+    """Modification times of all existing font stamp folders."""
+    key = []
+    for path in FONT_STAMP_DIRS:
+        path = os.path.expanduser(path)
+        try:
+            key.append([path, os.stat(path).st_mtime])
+        except OSError:
+            continue
+    return [CACHE_VERSION, key]
+
+
+def enumerate_families():
+    """Ask the default Pango font map for all installed families (slow)."""
+    import gi
+    gi.require_version('PangoCairo', '1.0')
+    from gi.repository import PangoCairo
+
+    logging.debug("enumerating installed font families")
+    font_map = PangoCairo.font_map_get_default()
+    return sorted(f.get_name() for f in font_map.list_families())
+
+
+def load_cache(key):
+    try:
+        with open(cache_path()) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cache.get("key") != key:
+        logging.debug("font cache is stale")
+        return None
+    return cache.get("families")
+
+
+def save_cache(key, families):
+    path = cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "%s.%s.%s.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(tmp, "w") as f:
+            json.dump({"key": key, "families": families}, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logging.debug("could not write font cache %s: %s", path, e)
+
+
+def list_families(refresh=False):
+    """
+    Return the names of all installed font families.
+
+    Served from the on-disk cache unless it is stale or `refresh` is set.
+    """
+    key = cache_key()
+    families = None if refresh else load_cache(key)
+    if families is None:
+        families = enumerate_families()
+        save_cache(key, families)
+    return families
+
+
+def missing(families):
+    """
+    Return the requested families which are not installed.
+
+    A cache miss triggers one fresh enumeration, so newly installed fonts are
+    found even if the font folders didn't change.
+    """
+    installed = set(list_families())
+    unknown = [f for f in families if f not in installed]
+    if unknown:
+        installed = set(list_families(refresh=True))
+        unknown = [f for f in unknown if f not in installed]
+    return unknown
+
+
+def fontconfig(command, *args):
+    """Return the output of the fontconfig tool `command`, None if it is not available or fails."""
+    path = shutil.which(command)
+    if path is None:
+        logging.debug("%s not found", command)
+        return None
+    try:
+        return subprocess.run([path] + list(args),
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              check=True, universal_newlines=True).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.debug("%s %s failed: %s", command, " ".join(args), e)
+        return None
+
+
+def font_files(family):
+    """
+    Return the font files of all styles of `family`, as resolved by fontconfig.
+
+    The family is matched first, so aliases like Sans, Serif or Monospace
+    resolve to the files of the family actually used. Returns an empty list
+    if fontconfig's tools are not available (e.g. with CoreText on macOS).
+    """
+    # fc-list doesn't apply aliases, fc-match does
+    matched = fontconfig("fc-match", "--format=%{file}\\n%{family[0]}", family)
+    if not matched:
+        logging.debug("can't resolve font files of '%s'", family)
+        return []
+    lines = matched.splitlines()
+    files = set(lines[:1])
+    if len(lines) > 1:
+        output = fontconfig("fc-list", "--format=%{file}\\n", lines[1])
+        files.update((output or "").splitlines())
+    return sorted(path for path in files if path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="papr fonts",
+                                     description='List the installed font families usable with -f/--fonts')
+    parser.add_argument("--refresh", action="store_true",
+                        help="rebuild the cached font list", default=False)
+    args = parser.parse_args(argv)
+
+    for family in list_families(refresh=args.refresh):
+        print(family)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
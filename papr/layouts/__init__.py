@@ -0,0 +1,92 @@
+"""
+Registry of calendar layouts.
+
+Layout modules are imported only when a layout is selected. External
+packages can provide additional layouts through the 'papr.layouts' entry
+point group, the entry point has to resolve to a module (or any object)
+with a drawCalendar(env) function, which draws the calendar and returns it
+as a papr.util.drawing.Document:
+
+    [project.entry-points."papr.layouts"]
+    poster = "mypackage.poster"
+"""
+
+import logging
+import importlib
+import threading
+
+ENTRY_POINT_GROUP = "papr.layouts"
+
+BUILTIN = {
+    "classic": "papr.layouts.classic",
+    "column": "papr.layouts.column",
+    "oneyear": "papr.layouts.oneyear",
+    "big": "papr.layouts.big",
+    "month": "papr.layouts.month",
+}
+
+_plugins = None
+_plugins_lock = threading.Lock()
+
+
+def plugins():
+    """Return the entry points of external layouts by name."""
+    global _plugins
+    with _plugins_lock:
+        if _plugins is None:
+            _plugins = _load_plugins()
+    return _plugins
+
+
+def _load_plugins():
+    from importlib.metadata import entry_points
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        eps = eps.select(group=ENTRY_POINT_GROUP)
+    else:
+        eps = eps.get(ENTRY_POINT_GROUP, [])
+
+    found = {}
+    for ep in eps:
+        if ep.name in BUILTIN:
+            logging.warning("layout plugin '%s' (%s) shadows a built-in layout and is ignored",
+                            ep.name, ep.value)
+            continue
+        found[ep.name] = ep
+    return found
+
+
+def names():
+    """Names of all available layouts, built-in layouts first."""
+    return tuple(BUILTIN) + tuple(sorted(plugins()))
+
+
+def known(name):
+    """
+    Whether `name` is an available layout. Installed plugins are only
+    looked up for names which are not built in, scanning the entry points
+    of every installed distribution is slow.
+    """
+    return name in BUILTIN or name in plugins()
+
+
+def unknown_message(name):
+    """Error message for the unknown layout `name`, listing the available ones."""
+    return "unknown layout: %r (choose from %s)" % (name, ", ".join(names()))
+
+
+def load(name):
+    """
+    Import the layout `name` and return its module.
+
+    Raises:
+        ValueError: if no such layout is registered
+    """
+    # imported for its side effect only: drawing pins the gi versions
+    # before a layout or plugin imports Pango
+    from papr.util import drawing  # noqa: F401
+    if name in BUILTIN:
+        return importlib.import_module(BUILTIN[name])
+    if name in plugins():
+        return plugins()[name].load()
+    raise ValueError(unknown_message(name))
@@ -12,21 +12,28 @@ import datetime
 import logging
 import calendar
 
-import cairo
-from gi.repository import Pango
-
 from papr.util import metrics
 from papr.util import drawing
+from papr.util import grid
+from papr.util import geometry
 
 
 # =============================================================================
 # CONFIGURATION - Easy to adjust values
+# Read once per render by drawCalendar into the render's own environment,
+# the drawing functions only use that copy.
 # =============================================================================
 
+# Number of months on one page
+MONTHS_PER_PAGE = 12
+
 # Number of days per row (columns)
 DAYS_PER_ROW = 21
 # DAYS_PER_ROW = 25
 
+# Number of cells the year label spans
+YEAR_LABEL_CELLS = 3
+
 # Font size in points for day/date text
 DAY_TEXT_FONT_SIZE = 4
 
@@ -47,21 +54,60 @@ FLAG_POLE_WIDTH = 0.5  # in mm
 def drawCalendar(env):
     logging.debug("Adding additional information to environment specific to Big layout")
 
-    # Use configurable columns
+    # Store configurable values
     env.columns = DAYS_PER_ROW
+    env.year_label_cells = YEAR_LABEL_CELLS
+    env.line_width = BORDER_WIDTH * metrics.MM
+    env.border_color = BORDER_COLOR
+    env.flag_color = FLAG_COLOR
+    env.flag_pole_width = FLAG_POLE_WIDTH * metrics.MM
+    env.day_text_size = DAY_TEXT_FONT_SIZE
+    env.month_label_size = MONTH_LABEL_FONT_SIZE
+
+    logging.debug("Creating Cairo Surface and Context")
+    logging.debug("width = %sp/%scm, height = %sp/%scm", env.height,
+                  env.height / metrics.CM, env.width, env.width / metrics.CM)
 
+    # Create landscape document, one page per 12 months
+    document = drawing.Document(env.height, env.width)
+    env.chrome = grid.ChromeCache(document.width, document.height)
+    for year, month in drawing.page_starts(env.year, env.month, env.months, MONTHS_PER_PAGE):
+        drawPage(document.new_page(), env, year, month)
+
+    logging.info("Finished drawing Calendar!")
+    return document
+
+
+def drawPage(cr, env, year, month):
+    """Draw the 12 months starting with `month` of `year` on one page."""
+    page = pageGeometry(env.height, env.width, env.safety, year, month,
+                        env.columns, env.year_label_cells)
+
+    # Draw the year labels in the padding space
+    for label in page.labels:
+        drawYearLabel(cr, env, label.date.year, label)
+
+    # Draw the static grid once, then the per-day text on top
+    drawGrid(cr, env, page.cells)
+    for cell in page.cells:
+        drawDay(cr, env, cell)
+
+
+@geometry.cached
+def pageGeometry(page_width, page_height, safety, year, month, columns, year_label_cells):
+    """Position the days of the 12 months starting with `month` of `year` on a landscape page."""
     # Starting date based on -m flag
-    start_date = datetime.date(env.year, env.month, 1)
+    start_date = datetime.date(year, month, 1)
 
     # Calculate end date (12 months from start)
     # If starting in April (4), end in March (3) of next year
     # If starting in January (1), end in December (12) of same year
-    if env.month == 1:
+    if month == 1:
         end_month = 12
-        end_year = env.year
+        end_year = year
     else:
-        end_month = env.month - 1
-        end_year = env.year + 1
+        end_month = month - 1
+        end_year = year + 1
 
     last_day_of_end_month = calendar.monthrange(end_year, end_month)[1]
     end_date = datetime.date(end_year, end_month, last_day_of_end_month)
@@ -69,148 +115,101 @@ def drawCalendar(env):
     # Calculate padding to align rows so they end with SAT SUN
     # Each row should start on Monday (weekday() = 0) and end on Sunday (weekday() = 6)
     # weekday(): Monday=0, Sunday=6
-    env.padding_cells = start_date.weekday()
+    padding_cells = start_date.weekday()
 
     # If not starting in January, we'll have a year transition
     # Use exactly 7 cells (one full week) for mid-year padding to maintain
     # vertical weekend alignment across the year transition
-    if env.month > 1:
-        env.mid_year_padding = 7
+    if month > 1:
+        mid_year_padding = 7
     else:
-        env.mid_year_padding = 0
+        mid_year_padding = 0
 
     # Calculate total days in each part
-    if env.month > 1:
-        dec31 = datetime.date(env.year, 12, 31)
-        days_first_part = (dec31 - start_date).days + 1
-        jan1_next = datetime.date(env.year + 1, 1, 1)
-        days_second_part = (end_date - jan1_next).days + 1
-        total_cells = env.padding_cells + days_first_part + env.mid_year_padding + days_second_part
-    else:
-        total_days = (end_date - start_date).days + 1
-        total_cells = env.padding_cells + total_days
-
-    env.rows = math.ceil(total_cells / env.columns)
+    total_days = (end_date - start_date).days + 1
+    total_cells = padding_cells + total_days + mid_year_padding
 
-    # Available width and height after margins (landscape: height is page width)
-    available_width = env.height - (2 * env.safety)
-    available_height = env.width - (2 * env.safety)
+    rows = math.ceil(total_cells / columns)
 
-    # Cell dimensions fill the available space
-    env.cell_width = available_width / env.columns
-    env.cell_height = available_height / env.rows
-
-    # Position grid at margins
-    env.offset_x = env.safety
-    env.offset_y = env.safety
-
-    # Store configurable values
-    env.line_width = BORDER_WIDTH * metrics.MM
-    env.border_color = BORDER_COLOR
-    env.flag_color = FLAG_COLOR
-    env.flag_pole_width = FLAG_POLE_WIDTH * metrics.MM
-    env.day_text_size = DAY_TEXT_FONT_SIZE
-    env.month_label_size = MONTH_LABEL_FONT_SIZE
+    # Cell dimensions fill the available space after margins
+    cell_width = (page_width - (2 * safety)) / columns
+    cell_height = (page_height - (2 * safety)) / rows
 
     logging.debug("Start date: %s, End date: %s", start_date, end_date)
-    logging.debug("Padding cells: %s (%s is %s)", env.padding_cells, start_date.strftime("%b 1"), start_date.strftime("%A"))
-    if env.month > 1:
-        logging.debug("Mid-year padding: %s cells (one week for alignment)", env.mid_year_padding)
-    logging.debug("Cell size: %s x %s mm", env.cell_width / metrics.MM, env.cell_height / metrics.MM)
-    logging.debug("Grid: %s columns x %s rows", env.columns, env.rows)
-
-    logging.debug("Creating Cairo Surface and Context")
-    logging.debug("width = %sp/%scm, height = %sp/%scm", env.height,
-                  env.height / metrics.CM, env.width, env.width / metrics.CM)
-
-    # Create landscape PDF
-    surface = drawing.create_surface(env.out, env.height, env.width)
-    cr = cairo.Context(surface)
-
-    # Draw the starting year in the padding space (if there is padding)
-    if env.padding_cells > 0:
-        drawYearLabel(cr, env, env.year, 0, env.padding_cells)
-
-    # Draw all days of the 12-month period
+    # geometry is locale independent, log the ISO weekday (Monday is 1)
+    logging.debug("Padding cells: %s (%s is weekday %s)", padding_cells, start_date, start_date.isoweekday())
+    if month > 1:
+        logging.debug("Mid-year padding: %s cells (one week for alignment)", mid_year_padding)
+    logging.debug("Cell size: %s x %s mm", cell_width / metrics.MM, cell_height / metrics.MM)
+    logging.debug("Grid: %s columns x %s rows", columns, rows)
+
+    page = geometry.page()
+
+    def addYearLabel(label_year, start_cell_index, padding_count):
+        # Year label takes up 3 cells width, right-aligned within the
+        # padding area to be adjacent to first day
+        label_width = year_label_cells * cell_width
+        start_col = start_cell_index % columns
+        start_row = start_cell_index // columns
+        x = safety + (start_col * cell_width) + (padding_count * cell_width - label_width)
+        y = safety + (start_row * cell_height)
+        page.labels.append(datetime.date(label_year, 1, 1), x, y, label_width, cell_height)
+
+    # The starting year goes in the padding space (if there is padding)
+    if padding_cells > 0:
+        addYearLabel(year, 0, padding_cells)
+
+    # Position all days of the 12-month period
     date = start_date
     ONE_DAY = datetime.timedelta(days=1)
-    cell_index = env.padding_cells  # Start after padding
-    drew_mid_year_label = False
+    cell_index = padding_cells  # Start after padding
 
     while date <= end_date:
-        # Check if we're at the year transition (January 1st of next year)
-        if env.month > 1 and date.month == 1 and date.day == 1 and date.year == env.year + 1 and not drew_mid_year_label:
-            # Draw the new year label in the mid-year padding cells
-            if env.mid_year_padding > 0:
-                drawYearLabel(cr, env, env.year + 1, cell_index, env.mid_year_padding)
-            cell_index += env.mid_year_padding
-            drew_mid_year_label = True
+        # At the year transition (January 1st of next year) the new year
+        # label goes in the mid-year padding cells
+        if mid_year_padding > 0 and date.month == 1 and date.day == 1:
+            addYearLabel(date.year, cell_index, mid_year_padding)
+            cell_index += mid_year_padding
 
-        col = cell_index % env.columns
-        row = cell_index // env.columns
+        col = cell_index % columns
+        row = cell_index // columns
 
-        x = env.offset_x + (col * env.cell_width)
-        y = env.offset_y + (row * env.cell_height)
-
-        # Check if this is the first day of a month
-        is_month_start = (date.day == 1)
-
-        drawDay(cr, env, x, y, date, is_month_start)
+        page.cells.append(date, safety + (col * cell_width), safety + (row * cell_height),
+                          cell_width, cell_height)
 
         date += ONE_DAY
         cell_index += 1
 
-    logging.info("Finished drawing Calendar!")
+    return page
 
 
-def drawYearLabel(cr, env, year, start_cell_index, padding_count):
+def drawYearLabel(cr, env, year, label):
     """Draw the year in big letters in the padding space.
 
     Args:
         cr: Cairo context
         env: Environment with layout settings
         year: The year number to display
-        start_cell_index: The cell index where the padding starts
-        padding_count: Number of padding cells available for the label
+        label: Box of the label in the padding space, from pageGeometry
     """
     with drawing.restoring_transform(cr):
         year_str = str(year)
 
-        # Calculate which row and column the padding starts at
-        start_col = start_cell_index % env.columns
-        start_row = start_cell_index // env.columns
-
-        # Year label takes up 3 cells width, right-aligned to be adjacent to first day
-        label_cells = 3
-        label_width = label_cells * env.cell_width
-        label_height = env.cell_height
+        label_width = label.width
+        label_height = label.height
+        label_start_x = label.x
+        label_start_y = label.y
 
-        # Position: right-aligned within the padding area
-        padding_width = padding_count * env.cell_width
-        label_start_x = env.offset_x + (start_col * env.cell_width) + (padding_width - label_width)
-        label_start_y = env.offset_y + (start_row * env.cell_height)
-
-        # Find the largest font size that fits in 3 cells
-        font_size = int(label_height * 0.8)
-        font = Pango.FontDescription("%s bold %s" % (env.font, font_size))
+        # Find the largest font size up to 80% of the label height whose
+        # ink fits 90% of the label width, but not below 10pt
+        font = env.fit.font(cr, year_str, label_width * 0.9, maximum=int(label_height * 0.8),
+                            minimum=10, style="bold", ink=True)
 
         # Measure text using ink extents for proper visual centering
-        temp_layout = drawing.create_layout_with_kerning(cr)
-        temp_layout.set_font_description(font)
-        temp_layout.set_text(year_str, -1)
-        ink_rect, logical_rect = temp_layout.get_pixel_extents()
+        ink_rect, logical_rect = env.measure.extents(cr, font, year_str)
         text_width = ink_rect.width
         text_height = ink_rect.height
 
-        # Reduce font size if text is too wide for 3 cells
-        while text_width > label_width * 0.9 and font_size > 10:
-            font_size -= 2
-            font = Pango.FontDescription("%s bold %s" % (env.font, font_size))
-            temp_layout.set_font_description(font)
-            ink_rect, logical_rect = temp_layout.get_pixel_extents()
-            text_width = ink_rect.width
-            text_height = ink_rect.height
-
         # Position: centered within the 3-cell label area
         # ink_rect.x and ink_rect.y are offsets from the layout origin to the ink
         x = label_start_x + (label_width - text_width) / 2 - ink_rect.x
@@ -218,51 +217,47 @@ def drawYearLabel(cr, env, year, start_cell_index, padding_count):
 
         # Draw the year
         cr.move_to(x, y)
-        with drawing.layout(cr) as layout:
+        with env.layout_pool.layout(cr) as layout:
             layout.set_font_description(font)
             layout.set_text(year_str, -1)
             cr.set_source_rgb(0.2, 0.2, 0.2)
 
 
-def drawDay(cr, env, x, y, date, is_month_start):
-    """Draw a single day cell."""
+def drawGrid(cr, env, cells):
+    """Draw weekend backgrounds and cell borders of all days, each as a single path."""
+    rects = cells.rects()
+    weekends = cells.rects(geometry.WEEKEND)
+
+    # pages with the same grid share one recording
+    env.chrome.draw(cr, (tuple(rects), tuple(weekends)),
+                    lambda chrome: grid.draw_cells(chrome, rects, weekends, (0.92, 0.92, 0.92),
+                                                   env.border_color, env.line_width))
+
+
+def drawDay(cr, env, cell):
+    """Draw the text of a single day cell, the cell itself is drawn by drawGrid."""
     with drawing.restoring_transform(cr):
-        cr.translate(x, y)
-
-        # Fill background for weekends
-        if date.isoweekday() >= 6:
-            cr.rectangle(0, 0, env.cell_width, env.cell_height)
-            cr.set_source_rgba(0.92, 0.92, 0.92, 1.0)
-            cr.fill()
-
-        # Stroke the cell border
-        cr.set_source_rgba(*env.border_color, 1.0)
-        cr.set_line_width(env.line_width)
-        cr.rectangle(0, 0, env.cell_width, env.cell_height)
-        cr.stroke()
+        cr.translate(cell.x, cell.y)
 
         # Draw day info (weekday and date) in top-right corner
         # Returns the padding used for baseline alignment
-        text_padding = drawDayInfo(cr, env, date)
+        text_padding = drawDayInfo(cr, env, cell)
 
         # Draw month label flag on the left if this is the start of a month
-        if is_month_start:
-            drawMonthLabel(cr, env, date, text_padding)
+        if cell.month_start:
+            drawMonthLabel(cr, env, cell, text_padding)
 
 
-def drawMonthLabel(cr, env, date, text_padding):
+def drawMonthLabel(cr, env, cell, text_padding):
     """Draw month abbreviation as a flag in the top-left corner with a pole to the bottom."""
     with drawing.restoring_transform(cr):
-        month_str = date.strftime("%b").upper()
+        month_str = env.names.month(cell.date, abbreviated=True, upper=True)
 
         font_size = env.month_label_size
-        font = Pango.FontDescription("%s bold %s" % (env.font, font_size))
+        font = env.font_registry.get(font_size, "bold")
 
         # Measure text (with kerning enabled)
-        temp_layout = drawing.create_layout_with_kerning(cr)
-        temp_layout.set_font_description(font)
-        temp_layout.set_text(month_str, -1)
-        text_width, text_height = temp_layout.get_pixel_size()
+        text_width, text_height = env.measure.size(cr, font, month_str)
 
         # Padding around text in flag
         padding_x = font_size * 0.4
@@ -284,7 +279,7 @@ def drawMonthLabel(cr, env, date, text_padding):
         cr.set_source_rgba(*env.flag_color, 1.0)
         cr.set_line_width(env.flag_pole_width)
         cr.move_to(pole_x, pole_y)
-        cr.line_to(pole_x, env.cell_height - pole_y)
+        cr.line_to(pole_x, cell.height - pole_y)
         cr.stroke()
 
         # Draw flag background
@@ -293,60 +288,40 @@ def drawMonthLabel(cr, env, date, text_padding):
         cr.fill()
 
         # Draw the text in white
-        with drawing.layout(cr) as layout:
-            layout.set_font_description(font)
-            layout.set_text(month_str, -1)
-            cr.move_to(flag_x + padding_x, flag_y + padding_y)
-            cr.set_source_rgb(1, 1, 1)
+        env.stamps.draw(cr, flag_x + padding_x, flag_y + padding_y, font, month_str, (1, 1, 1))
 
 
-def drawDayInfo(cr, env, date):
+def drawDayInfo(cr, env, cell):
     """Draw weekday abbreviation and date number in top-right corner, baseline aligned."""
     font_size = env.day_text_size
 
     # Half character width padding
     padding = font_size * 0.5
 
-    weekday_str = date.strftime("%a").upper()
-    day_str = str(date.day)
+    weekday_str = env.names.weekday(cell.date, abbreviated=True, upper=True)
+    day_str = str(cell.date.day)
 
     with drawing.restoring_transform(cr):
         # Create fonts - same size for both
-        font = Pango.FontDescription("%s %s" % (env.font, font_size))
-        font_bold = Pango.FontDescription("%s bold %s" % (env.font, font_size))
-
-        # Measure weekday (with kerning enabled)
-        weekday_layout = drawing.create_layout_with_kerning(cr)
-        weekday_layout.set_font_description(font)
-        weekday_layout.set_text(weekday_str, -1)
-        weekday_width, _ = weekday_layout.get_pixel_size()
+        font = env.font_registry.get(font_size)
+        font_bold = env.font_registry.get(font_size, "bold")
 
-        # Measure day number (with kerning enabled)
-        day_layout = drawing.create_layout_with_kerning(cr)
-        day_layout.set_font_description(font_bold)
-        day_layout.set_text(day_str, -1)
-        day_width, _ = day_layout.get_pixel_size()
+        # Measure weekday and day number (with kerning enabled)
+        weekday_width, _ = env.measure.size(cr, font, weekday_str)
+        day_width, _ = env.measure.size(cr, font_bold, day_str)
 
         # Gap between weekday and day number
         gap = padding * 0.5
 
         # Calculate total width and position from right
         total_width = weekday_width + gap + day_width
-        start_x = env.cell_width - padding - total_width
+        start_x = cell.width - padding - total_width
 
         # Draw weekday
-        with drawing.layout(cr) as layout:
-            layout.set_font_description(font)
-            layout.set_text(weekday_str, -1)
-            cr.move_to(start_x, padding)
-            cr.set_source_rgb(0.4, 0.4, 0.4)
+        env.stamps.draw(cr, start_x, padding, font, weekday_str, (0.4, 0.4, 0.4))
 
         # Draw day number after weekday, baseline aligned
-        with drawing.layout(cr) as layout:
-            layout.set_font_description(font_bold)
-            layout.set_text(day_str, -1)
-            cr.move_to(start_x + weekday_width + gap, padding)
-            cr.set_source_rgb(0.1, 0.1, 0.1)
+        env.stamps.draw(cr, start_x + weekday_width + gap, padding, font_bold, day_str, (0.1, 0.1, 0.1))
 
     # Return the padding used so month label can align
     return padding
@@ -5,12 +5,13 @@ import math
 import datetime
 import logging
 
-import cairo
-from gi.repository import Pango
-from gi.repository import PangoCairo
-
 from papr.util import metrics
 from papr.util import drawing
+from papr.util import grid
+from papr.util import geometry
+
+# Number of months on one page
+MONTHS_PER_PAGE = 2
 
 
 def drawCalendar(env):
@@ -18,10 +19,6 @@ def drawCalendar(env):
         "Adding aditional information to enviroment specific to this cal style")
     env.page_width = env.height / 4.0  # 4 pages in landscape
 
-    env.cell_width = (env.page_width -
-                      2.0 * env.safety) / 2
-    env.cell_height = (env.width / 8.0) - \
-        ((2 * env.safety) / 4.0)
     env.line_width = 0.01 * metrics.CM
     env.font_size = 6
 
@@ -29,12 +26,20 @@ def drawCalendar(env):
     logging.debug("width = %sp/%scm, height = %sp/%scm", env.height,
                   env.height / metrics.CM, env.width, env.width / metrics.CM)
 
-    surface = drawing.create_surface(env.out, env.height, env.width)
-    cr = cairo.Context(surface)
+    document = drawing.Document(env.height, env.width)
+    env.chrome = grid.ChromeCache(document.width, document.height)
+    for year, month in drawing.page_starts(env.year, env.month, env.months, MONTHS_PER_PAGE):
+        drawPage(document.new_page(), env, year, month)
+
+    logging.info("Finished drawing Calendar!")
+    return document
+
 
+def drawPage(cr, env, year, month):
+    """Draw `month` of `year` and the month after it on one page."""
     # draw first month
-    monthToDraw = env.month
-    yearToDraw = env.year
+    monthToDraw = month
+    yearToDraw = year
     with drawing.restoring_transform(cr):
         cr.translate(env.height, env.width / 2)
         cr.rotate(math.pi)
@@ -62,14 +67,12 @@ def drawCalendar(env):
             drawText(cr, env, env.brand, env.height -
                      env.page_width + env.safety, 0 + 3, 6)
 
-    logging.info("Finished drawing Calendar!")
-
 
 def drawText(cr, env, text, x, y, fontSize):
     cr.move_to(x, y)
     # Number
-    with drawing.layout(cr) as layoutNumber:
-        fontNumber = Pango.FontDescription("%s heavy %s" % (env.font, fontSize))
+    with env.layout_pool.layout(cr) as layoutNumber:
+        fontNumber = env.font_registry.get(fontSize, "heavy")
         layoutNumber.set_font_description(fontNumber)
 
         layoutNumber.set_text(text.split()[0], -1)
@@ -79,97 +82,89 @@ def drawText(cr, env, text, x, y, fontSize):
             cr.set_source_rgb(0, 0, 0)
 
     # Day
-    dimensions = layoutNumber.get_pixel_size()
+    dimensions = env.measure.size(cr, fontNumber, text.split()[0])
     cr.move_to(x + dimensions[0] + fontSize / 2, y)
-    with drawing.layout(cr) as layoutDay:
-        fontDay = Pango.FontDescription("%s %s" % (env.font, fontSize))
+    with env.layout_pool.layout(cr) as layoutDay:
+        fontDay = env.font_registry.get(fontSize)
         layoutDay.set_font_description(fontDay)
 
         layoutDay.set_text(text.split()[1], -1)
         cr.set_source_rgb(0, 0, 0)
 
 
-def drawMonthTitle(cr, env, x, y, width, height, dateObject):
+def drawMonthTitle(cr, env, label):
     # preparing month string
-    style = "%B"
-    if(env.abbreviate_all):
-        style = "%b"
-    monthString = dateObject.strftime(style)
+    monthString = env.names.month(label.date, abbreviated=env.abbreviate_all)
 
-    with drawing.layout(cr) as layout:
+    with env.layout_pool.layout(cr) as layout:
         layout.set_text(monthString, -1)
 
-        # calculate font size
-        fits = False
-        fontSize = 20
-        while not fits:
-            font = Pango.FontDescription("%s %s" % (env.font, fontSize))
-            layout.set_font_description(font)
-            logging.debug("font size: %s pixel_size: %s",
-                          fontSize, layout.get_pixel_size())
-            if(layout.get_pixel_size()[0] <= env.cell_width):
-                fits = True
-            else:
-                fontSize -= 1
+        # calculate font size, at most 20pt and as wide as the label
+        font = env.fit.font(cr, monthString, label.width, maximum=20)
+        pixel_size = env.measure.size(cr, font, monthString)
+        logging.debug("font: %s pixel_size: %s", font.to_string(), pixel_size)
+        layout.set_font_description(font)
 
         # preparing cairo context
-        y += ((env.cell_height / 2) - (layout.get_pixel_size()[1] / 2))
-        cr.move_to(x, y)
+        y = label.y + ((label.height / 2) - (pixel_size[1] / 2))
+        cr.move_to(label.x, y)
         cr.set_source_rgb(0, 0, 0)
 
 
-def drawDay(cr, env, x, y, width, height, lineWidth, dateObject):
-    # fill box if weekend
-    if(dateObject.isoweekday() >= 6):
-        cr.rectangle(x, y, width, height)
-        cr.set_source_rgba(0.90, 0.90, 0.90, 1.0)
-        cr.fill()
+def drawGrid(cr, env, cells):
+    """Draw weekend backgrounds and boxes of all days, each as a single path."""
+    rects = cells.rects()
+    weekends = cells.rects(geometry.WEEKEND)
 
-    # stroke the box
-    cr.set_source_rgba(0, 0, 0, 1.0)
-    cr.set_line_width(lineWidth)
-    cr.rectangle(x, y, width, height)
-    cr.stroke()
+    env.chrome.draw(cr, (tuple(rects), tuple(weekends)),
+                    lambda chrome: grid.draw_cells(chrome, rects, weekends, (0.90, 0.90, 0.90),
+                                                   (0, 0, 0), env.line_width))
 
-    # drawing the text
+
+def drawDay(cr, env, cell):
+    # drawing the text, the box is drawn by drawGrid
     OFFSET_X, OFFSET_Y = math.floor(
         env.font_size * 0.3333), math.floor(env.font_size * 0.3333)
 
-    style = "%A"
-    if(env.abbreviate or env.abbreviate_all):
-        style = "%a"
-    dayString = "%s %s" % (dateObject.day, dateObject.strftime(style))
-    drawText(cr, env, dayString, x + OFFSET_X, y + OFFSET_Y, env.font_size)
+    abbreviated = env.abbreviate or env.abbreviate_all
+    dayString = "%s %s" % (cell.date.day, env.names.weekday(cell.date, abbreviated))
+    drawText(cr, env, dayString, cell.x + OFFSET_X, cell.y + OFFSET_Y, env.font_size)
 
 
-def drawMonth(cr, env, year, month):
+@geometry.cached
+def monthGeometry(page_width, page_height, safety, year, month):
+    """
+    Position the days of `month` of `year` on one half of the landscape
+    page, which is folded into 4 pages of 2 columns with 4 rows each. The
+    label is the box of the month title in the first cell.
+    """
+    column_page_width = page_width / 4.0  # 4 pages in landscape
+    cell_width = (column_page_width - 2.0 * safety) / 2
+    cell_height = (page_height / 8.0) - ((2 * safety) / 4.0)
 
     # Creating a new date object with the first day of the month to draw
     date = datetime.date(year, month, 1)
-    logging.info("drawing %s...", date.strftime("%B %Y"))
 
     # Defining a one day timedelta object to increase the date object
     one_day = datetime.timedelta(days=1)
 
-    # draw month name in first cell
-    drawMonthTitle(cr, env, env.safety, env.safety,
-                   env.cell_width, env.cell_height, date)
+    # month name in first cell
+    page = geometry.page()
+    page.labels.append(date, safety, safety, cell_width, cell_height)
 
     cellsOnPage = 1
     cellsOnPageMax = 8
-    page = 0
+    pageNo = 0
     row = 1
     column = 0
     # for every day of the month
     while month == date.month:
 
         # positions on page
-        x = env.safety + (page * env.page_width) + (column * env.cell_width)
-        y = env.safety + (row * env.cell_height)
+        x = safety + (pageNo * column_page_width) + (column * cell_width)
+        y = safety + (row * cell_height)
 
-        # draw day
-        drawDay(cr, env, x, y, env.cell_width,
-                env.cell_height, env.line_width, date)
+        page.cells.append(date, x, y, cell_width, cell_height)
 
         # increment cell counter
         cellsOnPage += 1
@@ -183,10 +178,26 @@ def drawMonth(cr, env, year, month):
             # reset cells on page counter
             cellsOnPage = 0
             # increment page counter
-            page += 1
+            pageNo += 1
             column = 0
             row = 0
 
         if(cellsOnPage == 4):
             row = 0
             column += 1
+
+    return page
+
+
+def drawMonth(cr, env, year, month):
+    page = monthGeometry(env.height, env.width, env.safety, year, month)
+    date = page.labels[0].date
+    logging.info("drawing %s %s...", env.names.month(date), date.year)
+
+    # draw month name in first cell
+    drawMonthTitle(cr, env, page.labels[0])
+
+    # draw the boxes of all days once, then the text on top
+    drawGrid(cr, env, page.cells)
+    for cell in page.cells:
+        drawDay(cr, env, cell)
@@ -1,16 +1,16 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import math
 import datetime
 import logging
 
-import cairo
-from gi.repository import Pango
-from gi.repository import PangoCairo
-
 from papr.util import metrics
 from papr.util import drawing
+from papr.util import grid
+from papr.util import geometry
+
+# Number of months on one page
+MONTHS_PER_PAGE = 4
 
 
 def drawCalendar(env):
@@ -18,92 +18,110 @@ def drawCalendar(env):
         "Adding aditional information to enviroment specific to this cal style")
     env.font_size = 6
     env.line_width = 0.01 * metrics.CM
-    env.column_width = env.height / 4.0  # 4 columns in landscape
-    env.row_width = (env.column_width -
-                     2.0 * env.safety)
-    env.row_height = (env.width - (4 * env.safety)) / 33
 
     logging.debug("Creating Cario Surface and Contex")
     logging.debug("width = %sp/%scm, height = %sp/%scm", env.height,
                   env.height / metrics.CM, env.width, env.width / metrics.CM)
-    surface = drawing.create_surface(env.out, env.height, env.width)
-    cr = cairo.Context(surface)
+    document = drawing.Document(env.height, env.width)
+    env.chrome = grid.ChromeCache(document.width, document.height)
+    for year, month in drawing.page_starts(env.year, env.month, env.months, MONTHS_PER_PAGE):
+        cr = document.new_page()
 
-    date = datetime.date(env.year, env.month, 1)
-    drawMonth(cr, env, date)
+        page = pageGeometry(env.height, env.width, env.safety, year, month)
+        drawMonth(cr, env, page)
     logging.info("Finished drawing Calendar!")
+    return document
 
 
-def drawMonth(cr, env, date):
-    # Creating a new date object with the first day of the month to draw
-    logging.info("drawing %s...", date.strftime("%B %Y"))
+@geometry.cached
+def pageGeometry(page_width, page_height, safety, year, month):
+    """Position the days of 4 months starting with `month` of `year` in 4 columns, the labels are the month title boxes."""
+    column_width = page_width / 4.0  # 4 columns in landscape
+    row_width = (column_width - 2.0 * safety)
+    row_height = (page_height - (4 * safety)) / 33
 
     # Defining a one day timedelta object to increase the date object
     ONE_DAY = datetime.timedelta(days=1)
+
+    # Collect the days of 4 months. 4 Month fit on one page
+    page = geometry.page()
+    date = datetime.date(year, month, 1)
+    for columnNo in range(0, MONTHS_PER_PAGE):
+        x = columnNo * column_width
+        # month title spans the two rows above the days
+        page.labels.append(date, x, safety, column_width, 2 * row_height)
+
+        startingMonth = date.month
+        while date.month == startingMonth:
+            page.cells.append(date, x + safety, dayOffset(safety, row_height, date),
+                              row_width, row_height)
+            # increment date by one day
+            date += ONE_DAY
+
+    return page
+
+
+def drawMonth(cr, env, page):
+    date = page.labels[0].date
+    logging.info("drawing %s %s...", env.names.month(date), date.year)
+
+    drawGrid(cr, env, page.cells)
+
+    for label in page.labels:
+        drawMonthTitle(cr, env, label)
+    # for every day of the months
+    for cell in page.cells:
+        drawDay(cr, env, cell)
+
+
+def drawGrid(cr, env, cells):
+    """Draw weekend backgrounds and row boxes of all days, each as a single path."""
+    rects = cells.rects()
+    weekends = cells.rects(geometry.WEEKEND)
+
+    env.chrome.draw(cr, (tuple(rects), tuple(weekends)),
+                    lambda chrome: grid.draw_cells(chrome, rects, weekends, (0.90, 0.90, 0.90),
+                                                   (0, 0, 0), env.line_width))
+
+
+def drawMonthTitle(cr, env, label):
     with drawing.restoring_transform(cr):
-        # artificial offset for layouting, later it will be the months title!
-        for columnNo in range(0, 4):  # Iterate over 4 Month. 4 Month fit on one page
-            with drawing.restoring_transform(cr):
-                # move on the page to draw next month
-                cr.translate(columnNo * env.column_width, 0)
-                drawMonthTitle(cr, env, date)
-                # for every day of the month
-                startingMonth = date.month
-                while date.month == startingMonth:
-                    # increment date by one day
-                    drawDay(cr, env, date)
-                    date += ONE_DAY
-
-
-def drawMonthTitle(cr, env, date):
-    with drawing.restoring_transform(cr):
-        with drawing.layout(cr) as layout:
-            font = Pango.FontDescription("%s %s" % (env.font, env.font_size * 2))
+        with env.layout_pool.layout(cr) as layout:
+            font = env.font_registry.get(env.font_size * 2)
             layout.set_font_description(font)
 
             # preparing month string
-            style = "%B"
-            if(env.abbreviate_all):
-                style = "%b"
-            monthString = date.strftime(style)
+            monthString = env.names.month(label.date, abbreviated=env.abbreviate_all)
 
             layout.set_text(monthString, -1)
-            xOffset = (env.column_width - layout.get_pixel_size()[0]) / 2
-            yOffset = (((env.row_height * 2) -
-                        layout.get_pixel_size()[1]) / 2) + env.safety
+            pixel_size = env.measure.size(cr, font, monthString)
+            xOffset = label.x + (label.width - pixel_size[0]) / 2
+            yOffset = label.y + (label.height - pixel_size[1]) / 2
 
             cr.translate(xOffset, yOffset)
 
 
-def drawDay(cr, env, date):
+def dayOffset(safety, row_height, date):
+    """Vertical position of the row of `date`."""
+    yOffset = safety + (2 * row_height) + ((date.day - 1) * row_height)
+    if(date.day > 15):  # add folding margin for other half of the month
+        yOffset += 2 * safety
+    return yOffset
+
+
+def drawDay(cr, env, cell):
     with drawing.restoring_transform(cr):
-        yOffset = env.safety + (2 * env.row_height) + ((date.day - 1) * env.row_height)
-        if(date.day > 15):  # add folding margin for other half of the month
-            yOffset += 2 * env.safety
         # translate to drawing point
-        cr.translate(env.safety, yOffset)
-        # fill box if weekend
-        if(date.isoweekday() >= 6):
-            cr.set_source_rgba(0.90, 0.90, 0.90, 1.0)
-            cr.rectangle(0, 0, env.row_width, env.row_height)
-            cr.fill()
-
-        # stroke the box
-        cr.set_source_rgba(0, 0, 0, 1.0)
-        cr.set_line_width(env.line_width)
-        cr.rectangle(0, 0, env.row_width, env.row_height)
-        cr.stroke()
+        cr.translate(cell.x, cell.y)
 
         # Text
-        with drawing.layout(cr) as layout:
-            font = Pango.FontDescription("%s %s" % (env.font, env.font_size))
+        with env.layout_pool.layout(cr) as layout:
+            font = env.font_registry.get(env.font_size)
             layout.set_font_description(font)
 
-            style = "%A"
-            if(env.abbreviate or env.abbreviate_all):
-                style = "%a"
-            dayString = "%s %s" % (date.day, date.strftime(style))
+            abbreviated = env.abbreviate or env.abbreviate_all
+            dayString = "%s %s" % (cell.date.day, env.names.weekday(cell.date, abbreviated))
             layout.set_text(dayString, -1)
 
-            yOffset = (env.row_height - (layout.get_pixel_size()[1])) / 2
+            yOffset = (cell.height - (env.measure.size(cr, font, dayString)[1])) / 2
             cr.translate(env.font_size / 2, yOffset)
@@ -11,10 +11,10 @@ import calendar
 import datetime
 import logging
 
-import cairo
-from gi.repository import Pango
+from papr.util import drawing, geometry, grid, metrics, styles
 
-from papr.util import drawing, metrics, styles
+# Number of months on one page
+MONTHS_PER_PAGE = 1
 
 
 def drawCalendar(env):
@@ -26,29 +26,11 @@ def drawCalendar(env):
     page_width = env.width
     page_height = env.height
 
-    # Available area after margins
-    available_width = page_width - (2 * env.safety)
-    available_height = page_height - (2 * env.safety)
-
-    # Split page: 1/3 header, 2/3 grid
-    env.header_height = available_height / 3
-    env.grid_height = available_height * 2 / 3
-
-    # Grid setup: 7 columns (Mon-Sun)
-    env.columns = 7
-
-    # Calculate rows needed (max 6 weeks + 1 header row)
-    env.header_row_height = env.grid_height * 0.08  # weekday header row
-    env.grid_content_height = env.grid_height - env.header_row_height
-    env.rows = 6  # max weeks in a month view
-    env.cell_width = available_width / env.columns
-    env.cell_height = env.grid_content_height / env.rows
-
-    # Offsets
+    # Header takes the top 1/3 of the available area, pageGeometry puts the
+    # grid in the remaining 2/3
+    env.header_height = (page_height - (2 * env.safety)) / 3
     env.offset_x = env.safety
     env.header_offset_y = env.safety
-    env.weekday_header_y = env.safety + env.header_height
-    env.grid_offset_y = env.weekday_header_y + env.header_row_height
 
     # Style settings from central config
     env.line_width = styles.BORDER_WIDTH * metrics.MM
@@ -60,55 +42,98 @@ def drawCalendar(env):
 
     # Font sizes
     env.day_text_size = 8
-    env.weekday_header_font_size = env.header_row_height * 0.5
 
     logging.debug("Page: %s x %s mm", page_width / metrics.MM, page_height / metrics.MM)
     logging.debug("Header height: %s mm", env.header_height / metrics.MM)
-    logging.debug("Grid: %s cols x %s rows", env.columns, env.rows)
-    logging.debug(
-        "Cell size: %s x %s mm",
-        env.cell_width / metrics.MM,
-        env.cell_height / metrics.MM,
-    )
 
-    # Create PDF surface (portrait)
-    surface = drawing.create_surface(env.out, page_width, page_height)
-    cr = cairo.Context(surface)
+    # Create portrait document, one page per month
+    document = drawing.Document(page_width, page_height)
+    env.chrome = grid.ChromeCache(document.width, document.height)
+    for year, month in drawing.page_starts(env.year, env.month, env.months, MONTHS_PER_PAGE):
+        cr = document.new_page()
+        page = pageGeometry(page_width, page_height, env.safety, year, month)
 
-    # Draw components
-    date = datetime.date(env.year, env.month, 1)
-    drawHeader(cr, env, date)
-    drawWeekdayHeaders(cr, env)
-    drawDaysGrid(cr, env, date)
+        # Draw components
+        drawHeader(cr, env, datetime.date(year, month, 1))
+        drawWeekdayHeaders(cr, env, page.labels)
+        drawDaysGrid(cr, env, page.cells)
 
     logging.info("Finished drawing Calendar!")
+    return document
+
+
+@geometry.cached
+def pageGeometry(page_width, page_height, safety, year, month):
+    """
+    Position the days of `month` in a 7-column grid (Mon-Sun) in the bottom
+    2/3 of the page, the labels are the weekday header boxes above it.
+    """
+    # Available area after margins
+    available_width = page_width - (2 * safety)
+    available_height = page_height - (2 * safety)
+
+    header_height = available_height / 3
+    grid_height = available_height * 2 / 3
+
+    # 6 rows (max weeks in a month view) below a weekday header row
+    columns = 7
+    rows = 6
+    header_row_height = grid_height * 0.08
+    cell_width = available_width / columns
+    cell_height = (grid_height - header_row_height) / rows
+
+    weekday_header_y = safety + header_height
+    grid_offset_y = weekday_header_y + header_row_height
+
+    logging.debug("Grid: %s cols x %s rows", columns, rows)
+    logging.debug("Cell size: %s x %s mm", cell_width / metrics.MM, cell_height / metrics.MM)
+
+    page = geometry.page()
+    first_of_month = datetime.date(year, month, 1)
+
+    # Find first day position (Monday = 0)
+    first_weekday = first_of_month.weekday()
+
+    # One header box per weekday, dated by the days of the first week
+    monday = first_of_month - datetime.timedelta(days=first_weekday)
+    for col in range(columns):
+        page.labels.append(monday + datetime.timedelta(days=col),
+                           safety + (col * cell_width), weekday_header_y,
+                           cell_width, header_row_height)
+
+    # Get number of days in month
+    days_in_month = calendar.monthrange(year, month)[1]
+
+    for day in range(1, days_in_month + 1):
+        # Calculate cell position
+        day_offset = first_weekday + day - 1
+        col = day_offset % columns
+        row = day_offset // columns
+
+        page.cells.append(datetime.date(year, month, day),
+                          safety + (col * cell_width), grid_offset_y + (row * cell_height),
+                          cell_width, cell_height)
+
+    return page
 
 
 def drawHeader(cr, env, date):
     """Draw year (small) and month abbreviation (large) in top 1/3."""
     with drawing.restoring_transform(cr):
         year_str = str(date.year)
-        month_str = date.strftime("%b").upper()
+        month_str = env.names.month(date, abbreviated=True, upper=True)
 
         # Calculate font sizes - month is 5x year
         # Start with month taking ~60% of header height
         month_font_size = int(env.header_height * 0.5)
         year_font_size = int(month_font_size / 5)
 
-        year_font = Pango.FontDescription("%s bold %s" % (env.font, year_font_size))
-        month_font = Pango.FontDescription("%s bold %s" % (env.font, month_font_size))
-
-        # Measure year text
-        year_layout = drawing.create_layout_with_kerning(cr)
-        year_layout.set_font_description(year_font)
-        year_layout.set_text(year_str, -1)
-        year_width, year_height = year_layout.get_pixel_size()
+        year_font = env.font_registry.get(year_font_size, "bold")
+        month_font = env.font_registry.get(month_font_size, "bold")
 
-        # Measure month text
-        month_layout = drawing.create_layout_with_kerning(cr)
-        month_layout.set_font_description(month_font)
-        month_layout.set_text(month_str, -1)
-        month_width, month_height = month_layout.get_pixel_size()
+        # Measure year and month text
+        year_width, year_height = env.measure.size(cr, year_font, year_str)
+        month_width, month_height = env.measure.size(cr, month_font, month_str)
 
         # Center horizontally
         available_width = env.width - (2 * env.safety)
@@ -129,128 +154,82 @@ def drawHeader(cr, env, date):
 
         # Draw year (above month)
         cr.move_to(year_x, year_y)
-        with drawing.layout(cr) as layout:
+        with env.layout_pool.layout(cr) as layout:
             layout.set_font_description(year_font)
             layout.set_text(year_str, -1)
             cr.set_source_rgb(*env.text_color_primary)
 
         # Draw month (centered in header)
         cr.move_to(month_x, month_y)
-        with drawing.layout(cr) as layout:
+        with env.layout_pool.layout(cr) as layout:
             layout.set_font_description(month_font)
             layout.set_text(month_str, -1)
             cr.set_source_rgb(*env.text_color_primary)
 
 
-def drawWeekdayHeaders(cr, env):
+def drawWeekdayHeaders(cr, env, labels):
     """Draw weekday abbreviations as column headers (MON TUE WED THU FRI SAT SUN)."""
-    weekdays = ["MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN"]
+    font = env.font_registry.get(int(labels[0].height * 0.5), "bold")
 
-    font = Pango.FontDescription(
-        "%s bold %s" % (env.font, int(env.weekday_header_font_size))
-    )
-
-    for col, day_name in enumerate(weekdays):
-        x = env.offset_x + (col * env.cell_width)
-        y = env.weekday_header_y
+    for label in labels:
+        day_name = env.names.weekday(label.date, abbreviated=True, upper=True)
 
         with drawing.restoring_transform(cr):
-            cr.translate(x, y)
+            cr.translate(label.x, label.y)
 
             # Measure text for centering
-            temp_layout = drawing.create_layout_with_kerning(cr)
-            temp_layout.set_font_description(font)
-            temp_layout.set_text(day_name, -1)
-            text_width, text_height = temp_layout.get_pixel_size()
+            text_width, text_height = env.measure.size(cr, font, day_name)
 
             # Center in cell
-            text_x = (env.cell_width - text_width) / 2
-            text_y = (env.header_row_height - text_height) / 2
+            text_x = (label.width - text_width) / 2
+            text_y = (label.height - text_height) / 2
 
-            cr.move_to(text_x, text_y)
-            with drawing.layout(cr) as layout:
-                layout.set_font_description(font)
-                layout.set_text(day_name, -1)
-                # Weekend headers slightly different color
-                if col >= 5:
-                    cr.set_source_rgb(*env.text_color_secondary)
-                else:
-                    cr.set_source_rgb(*env.text_color_primary)
+            # Weekend headers slightly different color
+            if label.weekend:
+                color = env.text_color_secondary
+            else:
+                color = env.text_color_primary
+            env.stamps.draw(cr, text_x, text_y, font, day_name, color)
 
 
-def drawDaysGrid(cr, env, first_of_month):
+def drawDaysGrid(cr, env, cells):
     """Draw the days grid with date numbers and week numbers."""
-    # Find first day position (Monday = 0)
-    first_weekday = first_of_month.weekday()
-
-    # Get number of days in month
-    days_in_month = calendar.monthrange(first_of_month.year, first_of_month.month)[1]
-
-    ONE_DAY = datetime.timedelta(days=1)
-    date = first_of_month
-
-    for day in range(1, days_in_month + 1):
-        # Calculate cell position
-        day_offset = first_weekday + day - 1
-        col = day_offset % 7
-        row = day_offset // 7
+    # Draw the static grid once, then the per-day text on top
+    rects = cells.rects()
+    weekends = cells.rects(geometry.WEEKEND)
+    env.chrome.draw(cr, (tuple(rects), tuple(weekends)),
+                    lambda chrome: grid.draw_cells(chrome, rects, weekends, env.weekend_bg_color,
+                                                   env.border_color, env.line_width))
 
-        x = env.offset_x + (col * env.cell_width)
-        y = env.grid_offset_y + (row * env.cell_height)
+    for cell in cells:
+        # Show the week number on Mondays (start of week)
+        drawDayCell(cr, env, cell, cell.week_start)
 
-        # Check if Monday (start of week) - show week number
-        is_monday = date.weekday() == 0
 
-        drawDayCell(cr, env, x, y, date, is_monday)
-        date += ONE_DAY
-
-
-def drawDayCell(cr, env, x, y, date, show_week_number):
-    """Draw a single day cell with date number (top-right) and week number (top-left)."""
+def drawDayCell(cr, env, cell, show_week_number):
+    """Draw date number (top-right) and week number (top-left) of a day cell, the cell itself is drawn by drawDaysGrid."""
     with drawing.restoring_transform(cr):
-        cr.translate(x, y)
-
-        # Fill background for weekends
-        if date.isoweekday() >= 6:
-            cr.rectangle(0, 0, env.cell_width, env.cell_height)
-            cr.set_source_rgba(*env.weekend_bg_color, 1.0)
-            cr.fill()
-
-        # Stroke cell border
-        cr.set_source_rgba(*env.border_color, 1.0)
-        cr.set_line_width(env.line_width)
-        cr.rectangle(0, 0, env.cell_width, env.cell_height)
-        cr.stroke()
+        cr.translate(cell.x, cell.y)
+        date = cell.date
 
         font_size = env.day_text_size
         padding = font_size * 0.5
 
-        font = Pango.FontDescription("%s %s" % (env.font, font_size))
-        font_bold = Pango.FontDescription("%s bold %s" % (env.font, font_size))
+        font = env.font_registry.get(font_size)
+        font_bold = env.font_registry.get(font_size, "bold")
 
         # Draw day number in top-right corner
         day_str = str(date.day)
 
-        day_layout = drawing.create_layout_with_kerning(cr)
-        day_layout.set_font_description(font_bold)
-        day_layout.set_text(day_str, -1)
-        day_width, _ = day_layout.get_pixel_size()
+        day_width, _ = env.measure.size(cr, font_bold, day_str)
 
-        day_x = env.cell_width - padding - day_width
+        day_x = cell.width - padding - day_width
 
-        with drawing.layout(cr) as layout:
-            layout.set_font_description(font_bold)
-            layout.set_text(day_str, -1)
-            cr.move_to(day_x, padding)
-            cr.set_source_rgb(*env.text_color_primary)
+        env.stamps.draw(cr, day_x, padding, font_bold, day_str, env.text_color_primary)
 
         # Draw week number in top-left corner (Monday only)
         if show_week_number:
             iso_week = date.isocalendar()[1]
             week_str = str(iso_week)
 
-            with drawing.layout(cr) as layout:
-                layout.set_font_description(font)
-                layout.set_text(week_str, -1)
-                cr.move_to(padding, padding)
-                cr.set_source_rgb(*env.text_color_secondary)
+            env.stamps.draw(cr, padding, padding, font, week_str, env.text_color_secondary)
@@ -5,12 +5,13 @@ import math
 import datetime
 import logging
 
-import cairo
-from gi.repository import Pango
-from gi.repository import PangoCairo
-
 from papr.util import metrics
 from papr.util import drawing
+from papr.util import grid
+from papr.util import geometry
+
+# Number of months on one page
+MONTHS_PER_PAGE = 12
 
 
 def drawCalendar(env):
@@ -18,123 +19,132 @@ def drawCalendar(env):
         "Adding additional information to environment specific to this cal style")
     env.font_size = 6
     env.line_width = 0.01 * metrics.CM
-    env.row_width = (env.height - (13.0 * env.safety)) / 12.0
-    env.row_height = (env.width - (2 * env.safety)) / 32
-
-    logging.debug('row is %smm/%spx wide', env.row_width / metrics.MM, env.row_width)
-    logging.debug('row is %smm/%spx high', env.row_height / metrics.MM, env.row_height)
 
     logging.debug("Creating Cairo Surface and Context")
     logging.debug("width = %sp/%scm, height = %sp/%scm", env.height,
                   env.height / metrics.CM, env.width, env.width / metrics.CM)
-    surface = drawing.create_surface(env.out, env.height, env.width)
-    cr = cairo.Context(surface)
+    document = drawing.Document(env.height, env.width)
+    env.chrome = grid.ChromeCache(document.width, document.height)
+    for year, month in drawing.page_starts(env.year, env.month, env.months, MONTHS_PER_PAGE):
+        cr = document.new_page()
 
-    date = datetime.date(env.year, env.month, 1)
-    drawMonth(cr, env, date) # TODO using it totally worng, loop here over the function not in the function itself!
+        page = pageGeometry(env.height, env.width, env.safety, year, month)
+        drawMonth(cr, env, page)
     logging.info("Finished drawing Calendar!")
+    return document
 
 
-def drawMonth(cr, env, date):
-    # Creating a new date object with the first day of the month to draw
-    logging.info("drawing %s...", date.strftime("%B %Y"))
+@geometry.cached
+def pageGeometry(page_width, page_height, safety, year, month):
+    """Position the days of 12 months starting with `month` of `year` in 12 columns, the labels are the month title boxes."""
+    row_width = (page_width - (13.0 * safety)) / 12.0
+    row_height = (page_height - (2 * safety)) / 32
+
+    logging.debug('row is %smm/%spx wide', row_width / metrics.MM, row_width)
+    logging.debug('row is %smm/%spx high', row_height / metrics.MM, row_height)
 
     # Defining a one day timedelta object to increase the date object
     ONE_DAY = datetime.timedelta(days=1)
-    for columnNo in range(0, 12):  # Iterate over 4 Month. 4 Month fit on one page
-        with drawing.restoring_transform(cr):
-            # move on the page to draw next month
-            cr.translate(env.safety + (columnNo * env.row_width) +
-                         (columnNo * env.safety), 0)
-            drawMonthTitle(cr, env, date)
-            # for every day of the month
-            startingMonth = date.month
-            while date.month == startingMonth:
-                drawDay(cr, env, date)
-                # increment date by one day
-                date += ONE_DAY
-
-
-def drawMonthTitle(cr, env, date):
-    with drawing.restoring_transform(cr):
-        with drawing.layout(cr) as layout:
-            size = math.ceil(env.row_height * 0.9) # calculating font-size depending on the row height
-            font = Pango.FontDescription("%s %s" % (env.fontHeading, size))
-            layout.set_font_description(font)
 
-            # preparing month string
-            style = "%b"
-            # TODO String is always abbreviated, adjust the font-size depending on the row width for all month titles!
-            # style = "%B"
-            # if(env.abbreviate_all):
-            #     style = "%b"
-            monthString = date.strftime(style).upper()
+    page = geometry.page()
+    date = datetime.date(year, month, 1)
+    for columnNo in range(0, MONTHS_PER_PAGE):  # Iterate over 12 Month. 12 Month fit on one page
+        x = columnOffset(safety, row_width, columnNo)
+        # month title sits in the row above the first day
+        page.labels.append(date, x, safety, row_width, row_height)
 
-            layout.set_text(monthString, -1)
-            xOffset = (env.row_width - layout.get_pixel_size()[0]) / 2
-            yOffset = (env.safety + (1.0 * env.row_height)) - \
-                layout.get_pixel_size()[1]
+        startingMonth = date.month
+        while date.month == startingMonth:
+            page.cells.append(date, x, dayOffset(safety, row_height, date),
+                              row_width, row_height)
+            # increment date by one day
+            date += ONE_DAY
 
-            cr.translate(xOffset, yOffset)
+    return page
 
 
-def drawDay(cr, env, date):
-    with drawing.restoring_transform(cr):
-        yOffset = env.safety + \
-            ((date.day - 1) * env.row_height) + (1.0 * env.row_height)
+def drawMonth(cr, env, page):
+    date = page.labels[0].date
+    logging.info("drawing %s %s...", env.names.month(date), date.year)
 
-        # translate to drawing point top left corner
-        cr.translate(0.0, yOffset)
+    drawGrid(cr, env, page.cells)
 
-        # fill box if weekend
-        if(date.isoweekday() >= 6):
-            cr.set_source_rgba(0.90, 0.90, 0.90, 1.0)
-            cr.rectangle(0, 0, env.row_width, env.row_height)
+    for label in page.labels:
+        drawMonthTitle(cr, env, label)
+    # for every day of the months
+    for cell in page.cells:
+        drawDay(cr, env, cell)
 
-            cr.fill()
 
-        # stroke the box
-        cr.set_source_rgba(0, 0, 0, 1.0)
-        cr.set_line_width(env.line_width)
+def columnOffset(safety, row_width, columnNo):
+    """Horizontal position of the month column `columnNo`."""
+    return safety + (columnNo * row_width) + (columnNo * safety)
 
-        # cr.rectangle(0, 0, env.row_width, env.row_height)
-        cr.move_to(0, env.row_height)
-        cr.line_to(env.row_width, env.row_height)
-        cr.stroke()
 
-        daySize = math.floor(env.row_height * 0.25)
-        numberSize = math.floor(env.row_height * 0.4)
-        yOffset = (env.row_height* 0.25) / 4
+def dayOffset(safety, row_height, date):
+    """Vertical position of the row of `date`."""
+    return safety + \
+        ((date.day - 1) * row_height) + (1.0 * row_height)
 
-        dayFont = Pango.FontDescription("%s %s" % (env.font, daySize)) # day text is way smaller than number
-        numberFont = Pango.FontDescription("%s %s" % (env.font, numberSize))
 
-        style = "%a" # by default abbreviated because need of space!
-        # if(env.abbreviate or env.abbreviate_all):
-        #     style = "%a"
-        weekdayString = "%s" % (date.strftime(style))
+def drawGrid(cr, env, cells):
+    """Draw weekend backgrounds and row rules of all days, each as a single path."""
+    weekends = cells.rects(geometry.WEEKEND)
+    # rule below the box
+    rules = [(x, y + height, x + width, y + height) for x, y, width, height in cells.rects()]
 
+    def drawChrome(chrome):
+        grid.fill_cells(chrome, weekends, (0.90, 0.90, 0.90))
+        grid.stroke_segments(chrome, rules, (0, 0, 0), env.line_width)
 
-        with drawing.restoring_transform(cr):
-            with drawing.layout(cr) as numberLayout:
+    env.chrome.draw(cr, (tuple(weekends), tuple(rules)), drawChrome)
 
-                xOffset =  0
-                yOffset = (env.row_height - numberSize)/2
 
-                cr.translate(xOffset, yOffset)
-                numberLayout.set_font_description(numberFont)
-                numberLayout.set_text("%s" % date.day, -1) # Number
+def drawMonthTitle(cr, env, label):
+    with drawing.restoring_transform(cr):
+        with env.layout_pool.layout(cr) as layout:
+            # one font-size for all month titles: the largest up to 90% of the
+            # row height at which every abbreviated month name of the locale
+            # fits the row width
+            size = math.ceil(label.height * 0.9)
+            font = env.fit.font(cr, env.names.months(abbreviated=True, upper=True), label.width,
+                                maximum=size, heading=True)
+            layout.set_font_description(font)
+
+            # preparing month string, always abbreviated
+            monthString = env.names.month(label.date, abbreviated=True, upper=True)
+
+            layout.set_text(monthString, -1)
+            pixel_size = env.measure.size(cr, font, monthString)
+            xOffset = label.x + (label.width - pixel_size[0]) / 2
+            yOffset = (label.y + label.height) - pixel_size[1]
 
+            cr.translate(xOffset, yOffset)
+
+
+def drawDay(cr, env, cell):
+    date = cell.date
+    with drawing.restoring_transform(cr):
+        # translate to drawing point top left corner
+        cr.translate(cell.x, cell.y)
 
-        with drawing.restoring_transform(cr):
-            with drawing.layout(cr) as dayLayout:
+        daySize = math.floor(cell.height * 0.25)
+        numberSize = math.floor(cell.height * 0.4)
+        yOffset = (cell.height* 0.25) / 4
 
+        dayFont = env.font_registry.get(daySize) # day text is way smaller than number
+        numberFont = env.font_registry.get(numberSize)
 
-                xOffset = numberLayout.get_pixel_size()[0] * 1.025
-                yOffset = (env.row_height - numberSize)/2 + (daySize*0.8)
+        # by default abbreviated because need of space!
+        weekdayString = env.names.weekday(date, abbreviated=True)
 
-                cr.translate(xOffset, yOffset)
-                dayLayout.set_font_description(dayFont)
-                dayLayout.set_text(weekdayString[0], -1) # Weekday
 
+        # Number
+        xOffset = 0
+        yOffset = (cell.height - numberSize)/2
+        env.stamps.draw(cr, xOffset, yOffset, numberFont, "%s" % date.day, (0, 0, 0))
 
+        # Weekday
+        xOffset = env.measure.size(cr, numberFont, "%s" % date.day)[0] * 1.025
+        yOffset = (cell.height - numberSize)/2 + (daySize*0.8)
+        env.stamps.draw(cr, xOffset, yOffset, dayFont, weekdayString[0], (0, 0, 0))
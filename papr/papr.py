@@ -1,30 +1,215 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import io
 import sys
 import locale
+import inspect
 import argparse
 import datetime
 import logging
 
-import gi
-gi.require_version('PangoCairo', '1.0')
-from gi.repository import PangoCairo
-
+from papr import fonts
+from papr import layouts
 from papr.util import metrics
-from papr.layouts import classic
-from papr.layouts import column
-from papr.layouts import oneyear
-from papr.layouts import big
-from papr.layouts import month
+from papr.util import names
+from papr.util import profile
+
+
+# currently supported sizes of paper (width, height) in portrait orientation
+PAPER_SIZES = {
+    "A5": (14.8 * metrics.CM, 21.0 * metrics.CM),
+    "A4": (21.0 * metrics.CM, 29.7 * metrics.CM),
+    "A3": (29.7 * metrics.CM, 42.0 * metrics.CM),
+    "A2": (42.0 * metrics.CM, 59.4 * metrics.CM),
+    "A1": (59.4 * metrics.CM, 84.1 * metrics.CM),
+    "A0": (84.1 * metrics.CM, 118.9 * metrics.CM),
+    "USLetter": (8.5 * metrics.INCH, 11.0 * metrics.INCH),
+    "USTabloid": (11.0 * metrics.INCH, 17.0 * metrics.INCH),
+    "USLedger": (11.0 * metrics.INCH, 17.0 * metrics.INCH),
+}
+PAPER_NAMES = ("A5", "A4", "A3", "A2", "A1", "A0", "USLetter", "USTabloid", "USLedger")
+
+FORMATS = ("pdf", "svg", "png")
+
+# resolution of --draft raster output
+DRAFT_DPI = 72
+
+
+# type of every option of defaults(), normalize() rejects values of other
+# types instead of failing halfway through drawing
+OPTION_TYPES = {
+    "layout": str,
+    "out": str,
+    "format": str,
+    "dpi": int,
+    "grayscale": bool,
+    "tile_rows": int,
+    "tile_jobs": int,
+    "draft": bool,
+    "abbreviate_all": bool,
+    "abbreviate": bool,
+    "brand": str,
+    "color": bool,
+    "fonts": list,
+    "locale": str,
+    "month": int,
+    "months": int,
+    "year": int,
+    "paper": str,
+    "margin": int,
+    "verbose": bool,
+    "debug": bool,
+}
+
+
+def check_type(name, value):
+    """
+    Check `value` against the type of option `name`, None is accepted for
+    options which default to None.
+
+    Raises:
+        ValueError: if the value has the wrong type
+    """
+    expected = OPTION_TYPES[name]
+    if value is None and defaults()[name] is None:
+        return
+    # bool is a subclass of int, but True is no year
+    valid = isinstance(value, expected) and (expected is bool or not isinstance(value, bool))
+    if valid and expected is list:
+        valid = all(isinstance(item, str) for item in value)
+    if not valid:
+        raise ValueError("option %s must be %s, not %r" % (
+            name, "a list of strings" if expected is list else expected.__name__, value))
+
+
+def defaults():
+    """Default option values, shared by the command line and render()."""
+    td = datetime.date.today()
+    return {
+        "layout": None,
+        "out": "out.pdf",
+        "format": None,
+        "dpi": 300,
+        "grayscale": False,
+        "tile_rows": 256,
+        "tile_jobs": 1,
+        "draft": False,
+        "abbreviate_all": False,
+        "abbreviate": False,
+        "brand": "",
+        "color": False,
+        "fonts": ['Sans'],
+        "locale": "en_US",
+        "month": td.month,
+        "months": None,
+        "year": td.year,
+        "paper": "A4",
+        "margin": 5,
+        "verbose": False,
+        "debug": False,
+    }
 
 
-def main():
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # subcommands are dispatched before the calendar options are parsed
+    if argv and argv[0] == "batch":
+        from papr import batch
+        return batch.main(argv[1:])
+    if argv and argv[0] == "fonts":
+        return fonts.main(argv[1:])
+    if argv and argv[0] == "serve":
+        from papr import serve
+        return serve.main(argv[1:])
+
+    parser = build_parser()
+    environment = parser.parse_args(argv)
+    profiler = profile.Profiler() if environment.profile else None
+    validate(parser, environment, profiler)
+
+    # defining output
+    if(environment.debug):
+        logging.basicConfig(format='%(message)s', level=logging.DEBUG)
+    elif(environment.verbose):
+        logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+    try:
+        with profile.phase(profiler, "locale setup"):
+            environment = setup(environment)
+    except locale.Error:
+        logging.error(
+            "locale: '%s' not found!\nList all installed locales with 'locale -a' and choose locale with -l/--locale option.", environment.locale)
+        sys.exit(1)
+
+    if (environment.debug):
+        # Printing Options for Debugging
+        dic = vars(environment)
+        for key in dic:
+            if(dic[key] != None):
+                logging.debug("%s = %s", key, dic[key])
+
+    if environment.profile_dump:
+        import cProfile
+        render_profile = cProfile.Profile()
+        render_profile.enable()
+        document = draw(environment, profiler)
+        render_profile.disable()
+        render_profile.dump_stats(environment.profile_dump)
+        logging.info("render profile written to %s", environment.profile_dump)
+    else:
+        document = draw(environment, profiler)
+
+    for out in environment.out:
+        fmt = environment.format
+        if out == "-":
+            # stdout has no extension to detect the format from, logging
+            # and the --profile report go to stderr and stay out of the way
+            out = sys.stdout.buffer
+            if fmt is None:
+                fmt = "png" if environment.draft else "pdf"
+        try:
+            with profile.phase(profiler, "surface finish"):
+                document.write(out, fmt, environment.dpi, environment.grayscale,
+                               environment.tile_rows, environment.tile_jobs)
+        except (ValueError, OSError) as error:
+            logging.error("writing %s failed: %s", "stdout" if out is sys.stdout.buffer else out, error)
+            return 1
+
+    if profiler is not None:
+        report = profiler.json() if environment.profile_format == "json" else profiler.table()
+        print(report, file=sys.stderr)
+
+    return 0
+
+
+def build_parser():
+    """Return the argument parser of the calendar command line options."""
     # SetUp OptionParser
     parser = argparse.ArgumentParser(description='Create a Calendar')
 
-    parser.add_argument("-o", "--out", dest="out",
-                        help="specify output file (format detected from extension: .pdf or .svg)", default="out.pdf")
+    parser.add_argument("-o", "--out", dest="out", action="append",
+                        help="specify output file (format detected from extension: .pdf, .svg or .png), - writes to stdout, repeat to write several formats from a single drawing pass", default=None)
+
+    parser.add_argument("--format", choices=FORMATS,
+                        help="output format, overrides the format detected from the output file extension", default=None)
+
+    parser.add_argument("--dpi", type=int,
+                        help="resolution of PNG output, default is 300 (%s with --draft)" % DRAFT_DPI, default=None)
+
+    parser.add_argument("--grayscale", action="store_true",
+                        help="write PNG output as 8 bit grayscale", default=False)
+
+    parser.add_argument("--tile-rows", type=int, metavar="ROWS", default=256,
+                        help="render PNG output in bands of ROWS pixel rows, bounds memory on big sheets, default is 256")
+
+    parser.add_argument("--tile-jobs", type=int, metavar="N", default=1,
+                        help="render the PNG bands with N processes, default is 1")
+
+    parser.add_argument("--draft", action="store_true",
+                        help="fast preview: low resolution PNG (out.png unless -o is given) without kerning and ligatures, same geometry", default=False)
 
     parser.add_argument("-A", "--abbreviate_all", action="store_true",
                         help="use abbreviations for weekdays and months", default=False)
@@ -38,9 +223,8 @@ def main():
     parser.add_argument("-c", "--color", action="store_true",
                         help="color date numbers", default=False)
 
-    font_map = PangoCairo.font_map_get_default()
-    parser.add_argument("-f", "--fonts", choices=[f.get_name(
-    ) for f in font_map.list_families()], help="choose which font(s) to use", default=['Sans'], metavar="FONT", nargs="+")
+    parser.add_argument("-f", "--fonts", help="choose which font(s) to use, list installed fonts with 'papr fonts'",
+                        default=None, metavar="FONT", nargs="+")
 
     parser.add_argument("-l", "--locale",
                         help="choose locale to use (default en_US.UTF8, check 'locale -a' for available locales)", default="en_US")
@@ -50,13 +234,14 @@ def main():
     parser.add_argument("-m", "--month", type=int, choices=range(1, 13), metavar="MONTH",
                         help="specify the starting month as a number (1-12), default is the current month (" + str(td.month) + ").", default=td.month)
 
+    parser.add_argument("--months", type=int, metavar="N",
+                        help="number of consecutive months to cover, pages are added as needed, default is a single page", default=None)
+
     parser.add_argument("-y", "--year", type=int, choices=range(1990, datetime.MAXYEAR + 1), metavar="YEAR",
                         help="specify the year the calendar should start, default is the current year (" + str(td.year) + ").", default=td.year)
 
-    # currently supported sizes of paper
-    paperSizes = ("A5", "A4", "A3", "A2", "A1", "A0", "USLetter", "USTabloid", "USLedger")
-    parser.add_argument("-p", "--paper", choices=paperSizes,
-                        help="choose which paper dimensions should be used " + str(paperSizes) + " default is A4", default="A4")
+    parser.add_argument("-p", "--paper", choices=PAPER_NAMES,
+                        help="choose which paper dimensions should be used " + str(PAPER_NAMES) + " default is A4", default="A4")
 
     parser.add_argument("--margin", type=int,
                         help="specify the margin of the calendar in millimeters. Used to adapt to your printer, default ist 5mm", default=5)
@@ -66,85 +251,250 @@ def main():
 
     parser.add_argument("-d", "--debug", action="store_true",
                         help="print status and debug messages to stdout", default=False)
-    layouts = ("classic", "column", "oneyear", "big", "month")
-    parser.add_argument("layout", choices=layouts, metavar="LAYOUT",
-                        help="choose calendar layout: " + str(layouts))
-    environment = parser.parse_args()
 
-    # defining output
-    if(environment.debug):
-        logging.basicConfig(format='%(message)s', level=logging.DEBUG)
-    elif(environment.verbose):
-        logging.basicConfig(format='%(message)s', level=logging.INFO)
+    parser.add_argument("--profile", action="store_true",
+                        help="print the time spent per phase and layout function to stderr", default=False)
 
-    # setting locale
-    try:
-        logging.debug("setting locale to '%s'", environment.locale)
-        locale.setlocale(locale.LC_ALL, environment.locale)
-    except locale.Error:
-        logging.error(
-            "locale: '%s' not found!\nList all installed locales with 'locale -a' and choose locale with -l/--locale option.", environment.locale)
-        sys.exit(1)
+    parser.add_argument("--profile-format", choices=("table", "json"), default="table",
+                        help="format of the --profile report, default is table")
+
+    parser.add_argument("--profile-dump", metavar="FILE", default=None,
+                        help="write cProfile statistics of the render to FILE, readable with pstats")
+    # checked by validate(), listing the plugins as choices would scan the
+    # installed distributions on every start
+    parser.add_argument("layout", metavar="LAYOUT",
+                        help="choose calendar layout: " + str(tuple(layouts.BUILTIN)) + " or an installed plugin")
+    return parser
+
+
+def validate(parser, environment, profiler=None):
+    """
+    Fill in the defaults depending on other options and validate the parsed
+    options, exiting through parser.error() on invalid ones.
+    """
+    if not layouts.known(environment.layout):
+        parser.error("argument LAYOUT: " + layouts.unknown_message(environment.layout))
+
+    if environment.out is None:
+        environment.out = ["out.png"] if environment.draft else ["out.pdf"]
+    if environment.dpi is None:
+        environment.dpi = DRAFT_DPI if environment.draft else 300
+
+    # validate just the requested fonts instead of offering every installed
+    # family as choice, enumerating the font map is slow
+    if environment.fonts is None:
+        environment.fonts = ['Sans']
+    else:
+        with profile.phase(profiler, "font enumeration"):
+            unknown = fonts.missing(environment.fonts)
+        if unknown:
+            parser.error("argument -f/--fonts: font(s) not installed: %s (list installed fonts with 'papr fonts')"
+                         % ", ".join(repr(f) for f in unknown))
+
+    if environment.months is not None and environment.months < 1:
+        parser.error("argument --months: must be at least 1")
+    if environment.tile_rows < 1:
+        parser.error("argument --tile-rows: must be at least 1")
+    if environment.tile_jobs < 1:
+        parser.error("argument --tile-jobs: must be at least 1")
+    if environment.dpi < 1:
+        parser.error("argument --dpi: must be at least 1")
+
+
+def setup(options):
+    """
+    Derive the drawing environment from the parsed options.
+
+    Loads the month and weekday names of the locale, the page dimensions for
+    the chosen paper, the body and heading fonts and the printing safety
+    margin. Returns a new Namespace, `options` is left untouched.
+
+    Raises:
+        locale.Error: if the requested locale is not installed
+    """
+    environment = argparse.Namespace(**vars(options))
+
+    # month and weekday names, looked up by the layouts instead of strftime
+    # so rendering does not depend on the process-wide locale
+    logging.debug("loading names of locale '%s'", environment.locale)
+    environment.names = names.for_locale(environment.locale)
 
     logging.debug(
         "Adjusting width and height values according to desired paper format: " + environment.paper)
-    if environment.paper == "A5":
-        environment.width = 14.8 * metrics.CM
-        environment.height = 21.0 * metrics.CM
-    elif environment.paper == "A4":
-        environment.width = 21.0 * metrics.CM
-        environment.height = 29.7 * metrics.CM
-    elif environment.paper == "A3":
-        environment.width = 29.7 * metrics.CM
-        environment.height = 42.0 * metrics.CM
-    elif environment.paper == "A2":
-        environment.width = 42.0 * metrics.CM
-        environment.height = 59.4 * metrics.CM
-    elif environment.paper == "A1":
-        environment.width = 59.4 * metrics.CM
-        environment.height = 84.1 * metrics.CM
-    elif environment.paper == "A0":
-        environment.width = 84.1 * metrics.CM
-        environment.height = 118.9 * metrics.CM
-    elif environment.paper == "USLetter":
-        environment.width = 8.5 * metrics.INCH
-        environment.height = 11.0 * metrics.INCH
-    elif environment.paper == "USTabloid":
-        environment.width = 11.0 * metrics.INCH
-        environment.height = 17.0 * metrics.INCH
-    elif environment.paper == "USLedger":
-        environment.width = 11.0 * metrics.INCH
-        environment.height = 17.0 * metrics.INCH
-
+    environment.width, environment.height = PAPER_SIZES[environment.paper]
 
     # Setup fonts
-    environment.font = environment.fonts.pop() # last provided font is used generally
+    families = list(environment.fonts)
+    environment.font = families.pop() # last provided font is used generally
     try:
-        environment.fontHeading = environment.fonts.pop() # use additional provided font for headers
+        environment.fontHeading = families.pop() # use additional provided font for headers
     except IndexError:
         environment.fontHeading = environment.font # if just one font set heading font same as general
 
-
     # env.safety margin for printing (A4 printers a unable to print on the
     # whole page)
     environment.safety = environment.margin * metrics.MM
 
+    return environment
 
-    if (environment.debug):
-        # Printing Options for Debugging
-        dic = vars(environment)
-        for key in dic:
-            if(dic[key] != None):
-                logging.debug("%s = %s", key, dic[key])
 
-    drawCalendar = {"classic": classic.drawCalendar,
-                    "column": column.drawCalendar,
-                    "oneyear": oneyear.drawCalendar,
-                    "big": big.drawCalendar,
-                    "month": month.drawCalendar}
-    drawCalendar[environment.layout](environment)
+def draw(environment, profiler=None):
+    """
+    Draw the calendar of the chosen layout and return the recorded document.
+
+    The layout works on a private copy of `environment` with fresh text
+    caches, so one environment can be drawn by several threads at once.
+    With a `profiler` (papr.util.profile.Profiler) the render is timed per
+    phase and per layout function.
+    """
+    with profile.phase(profiler, "load layout"):
+        layout = layouts.load(environment.layout)
+    env = argparse.Namespace(**vars(environment))
+
+    # per render caches shared by all layouts
+    from papr.util import drawing, text
+    features = drawing.DRAFT_FONT_FEATURES if env.draft else drawing.FONT_FEATURES
+    env.measure = text.MeasureCache(features)
+    env.layout_pool = text.LayoutPool(features)
+    env.font_registry = text.FontRegistry(env.font, env.fontHeading)
+    env.stamps = text.StampCache(env.layout_pool, env.measure)
+    env.fit = text.TextFitter(env.measure, env.font_registry)
+
+    if profiler is None:
+        document = layout.drawCalendar(env)
+    else:
+        # the stamp cache shapes through these two as well
+        env.measure.extents = profiler.timed(env.measure.extents, "MeasureCache.extents", "text shaping")
+        env.layout_pool.layout = profiler.timed_context(env.layout_pool.layout, "text shaping")
+        with profiler.phase("render"):
+            if inspect.ismodule(layout):
+                with profiler.instrument(layout, {"Geometry": "geometry"}):
+                    document = layout.drawCalendar(env)
+            else:
+                document = layout.drawCalendar(env)
+    if not isinstance(document, drawing.Document):
+        raise TypeError("layout %r: drawCalendar(env) must return a papr.util.drawing.Document, not %r"
+                        % (env.layout, document))
+    document.draft = env.draft
+    document.stats.update({
+        "measure_hits": env.measure.hits,
+        "measure_misses": env.measure.misses,
+        "pango_layouts": env.measure.created + env.layout_pool.created,
+        "stamp_hits": env.stamps.hits,
+        "stamp_misses": env.stamps.misses,
+    })
+    logging.debug("text measurements: %s cache hits, %s misses",
+                  env.measure.hits, env.measure.misses)
+    logging.debug("pango layouts created: %s", document.stats["pango_layouts"])
+    logging.debug("text stamps: %s reused, %s recorded",
+                  env.stamps.hits, env.stamps.misses)
+    return document
+
+
+def normalize(options):
+    """
+    Complete a dict of options with the defaults and validate it.
+
+    Args:
+        options: dict of option names as used by the command line (the long
+            option names, e.g. {"layout": "big", "year": 2026, "paper": "A3",
+            "fonts": ["Avenir Next"], "format": "svg"}). Missing options use
+            the command line defaults.
+
+    Returns:
+        A new dict with a value for every option.
+
+    Raises:
+        ValueError: for unknown options, values of the wrong type, layouts,
+            paper sizes or formats
+    """
+    normalized = defaults()
+    unknown = set(options) - set(normalized)
+    if unknown:
+        raise ValueError("unknown options: %s" % ", ".join(sorted(unknown)))
+    for name, value in options.items():
+        check_type(name, value)
+    normalized.update(options)
+    # drafts are low resolution rasters unless asked otherwise
+    if normalized["draft"]:
+        if "format" not in options:
+            normalized["format"] = "png"
+        if "dpi" not in options:
+            normalized["dpi"] = DRAFT_DPI
+
+    if not layouts.known(normalized["layout"]):
+        raise ValueError(layouts.unknown_message(normalized["layout"]))
+    if not normalized["fonts"]:
+        raise ValueError("fonts must name at least one font family")
+    if normalized["paper"] not in PAPER_SIZES:
+        raise ValueError("unknown paper size: %r" % normalized["paper"])
+    if normalized["format"] is not None and normalized["format"] not in FORMATS:
+        raise ValueError("unknown format: %r" % normalized["format"])
+    if normalized["months"] is not None and normalized["months"] < 1:
+        raise ValueError("months must be at least 1: %r" % normalized["months"])
+    if normalized["dpi"] < 1:
+        raise ValueError("dpi must be at least 1: %r" % normalized["dpi"])
+    if normalized["tile_rows"] < 1:
+        raise ValueError("tile_rows must be at least 1: %r" % normalized["tile_rows"])
+    if normalized["tile_jobs"] < 1:
+        raise ValueError("tile_jobs must be at least 1: %r" % normalized["tile_jobs"])
+
+    return normalized
+
+
+def make_environment(options):
+    """
+    Build a drawing environment from a dict of options, see normalize().
+
+    Raises:
+        ValueError: for unknown options, layouts, paper sizes or formats
+        locale.Error: if the requested locale is not installed
+    """
+    return setup(argparse.Namespace(**normalize(options)))
+
+
+def render_document(options):
+    """
+    Draw a calendar once and return the recorded document.
+
+    The document can be written to several outputs with document.write(),
+    see make_environment() for the accepted options.
+    """
+    return draw(make_environment(options))
+
+
+def render(options, out=None):
+    """
+    Render a calendar in-process, without argparse and without touching the
+    filesystem unless `out` is given. Renders keep no shared mutable state, so render() can be
+    called from several threads at once, e.g. by a ThreadPoolExecutor.
+
+    Args:
+        options: dict of command line options, see make_environment(). "format"
+            defaults to "pdf".
+        out: optional writable binary file object to render into, e.g. an
+            open file, sys.stdout.buffer or a socket file. It is flushed but
+            not closed.
+
+    Returns:
+        The rendered document as bytes, or None when rendering into `out`.
+
+    Raises:
+        ValueError: for unknown options, layouts, paper sizes or formats
+        locale.Error: if the requested locale is not installed
+        cairo.Error, OSError: if `out` can't be written
+    """
+    env = make_environment(options)
+    document = draw(env)
+
+    buffer = io.BytesIO() if out is None else None
+    document.write(out if out is not None else buffer, env.format or "pdf", env.dpi, env.grayscale,
+                   env.tile_rows, env.tile_jobs)
+
+    if buffer is not None:
+        return buffer.getvalue()
+    return None
 
-    return 0
 
 if __name__ == "__main__":
     sys.exit(main())
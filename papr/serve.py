@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Local HTTP render service.
+Keeps gi, the font maps, the layouts and the default locale loaded and caches rendered outputs,
+so a request doesn't pay for interpreter startup. Requests are rendered
+concurrently by a fixed set of long-lived worker threads, each keeping its
+own warm font map (PangoCairo font maps belong to one thread).
+Usage: papr serve [--host HOST] [--port PORT] [--cache-size MB] [--workers N]
+
+Options are the long command line option names, passed as query parameters
+(GET /render?layout=big&year=2026&paper=A3&fonts=Avenir+Next&format=svg) or
+as a JSON object in the body of a POST /render request.
+"""
+
+import sys
+import json
+import locale
+import hashlib
+import argparse
+import logging
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from papr import papr
+from papr import fonts
+from papr import layouts
+from papr.util import names
+
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "svg": "image/svg+xml",
+    "png": "image/png",
+}
+
+# options which don't change the rendered output
+IGNORED_OPTIONS = ("out", "verbose", "debug", "tile_rows", "tile_jobs")
+
+# options fixed by the server: forking band workers while other request
+# threads are running is unsafe
+SERVER_OPTIONS = {"tile_jobs": 1}
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+class RenderCache(object):
+    """
+    LRU cache of rendered outputs, evicting the least recently used entries
+    above `max_bytes`. Safe to use from the request threads.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                data = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+def parse_query(query):
+    """Convert query parameters to typed options, see papr.OPTION_TYPES."""
+    options = {}
+    for name, values in parse_qs(query).items():
+        # unknown options are kept as strings and rejected by normalize()
+        option_type = papr.OPTION_TYPES.get(name, str)
+        if option_type is bool:
+            options[name] = values[-1].lower() in TRUE_VALUES
+        elif option_type is int:
+            options[name] = int(values[-1])
+        elif option_type is list:
+            options[name] = [v for value in values for v in value.split(",") if v]
+        else:
+            options[name] = values[-1]
+    return options
+
+
+def cache_key(options):
+    """Hash of the normalized options, equal for all requests rendering the same output."""
+    normalized = papr.normalize(options)
+    for name in IGNORED_OPTIONS:
+        normalized.pop(name, None)
+    if normalized["format"] is None:
+        normalized["format"] = "pdf"
+    encoded = json.dumps(normalized, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest(), normalized
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    cache = None
+    # renders run on these long-lived threads, the handler threads only wait
+    executor = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path not in ("/", "/render"):
+            self.send_error(404)
+            return
+        try:
+            options = parse_query(url.query)
+        except ValueError as e:
+            self.send_error(400, explain=str(e))
+            return
+        self.render(options)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path not in ("/", "/render"):
+            self.send_error(404)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            options = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(options, dict):
+                raise ValueError("expected a JSON object of options")
+        except ValueError as e:
+            self.send_error(400, explain=str(e))
+            return
+        self.render(options)
+
+    def render(self, options):
+        for name in IGNORED_OPTIONS:
+            options.pop(name, None)
+        try:
+            key, normalized = cache_key(options)
+        except (ValueError, TypeError) as e:
+            self.send_error(400, explain=str(e))
+            return
+
+        data = self.cache.get(key)
+        status = "hit"
+        if data is None:
+            status = "miss"
+            try:
+                data = self.executor.submit(papr.render, dict(normalized, **SERVER_OPTIONS)).result()
+            except ValueError as e:
+                self.send_error(400, explain=str(e))
+                return
+            except locale.Error:
+                self.send_error(400, explain="locale '%s' not found" % normalized["locale"])
+                return
+            except Exception:
+                logging.exception("rendering %s failed", normalized)
+                self.send_error(500)
+                return
+            self.cache.put(key, data)
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[normalized["format"]])
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", '"%s"' % key)
+        self.send_header("X-Papr-Cache", status)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.info("%s - %s", self.address_string(), format % args)
+
+
+def warm_up():
+    """Load the built-in layouts and the default locale's names once, before serving."""
+    logging.info("loading fonts and layouts...")
+    fonts.list_families()
+    for name in layouts.BUILTIN:
+        layouts.load(name)
+    try:
+        names.for_locale(papr.defaults()["locale"])
+    except locale.Error:
+        logging.warning("default locale '%s' not installed", papr.defaults()["locale"])
+
+
+def warm_up_worker():
+    """
+    Load the font map of the calling render thread and shape text with it
+    once, so the first request on this thread starts warm.
+    """
+    # papr.util.text pins the gi versions before PangoCairo is imported
+    from papr.util import text  # noqa: F401
+    from gi.repository import PangoCairo
+    PangoCairo.font_map_get_default()
+    try:
+        papr.render({"layout": "month", "format": "pdf"})
+    except locale.Error:
+        # reported by warm_up(), the font map is loaded by now
+        pass
+
+
+def start_workers(executor, count):
+    """Start all `count` threads of `executor` now, instead of on the first requests."""
+    # every task blocks until all are running, so each one gets its own thread
+    barrier = threading.Barrier(count)
+    for future in [executor.submit(barrier.wait) for _ in range(count)]:
+        future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="papr serve",
+                                     description='Serve rendered calendars over HTTP')
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to listen on, default is 127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="port to listen on, default is 8000")
+    parser.add_argument("--cache-size", type=int, default=256, metavar="MB",
+                        help="maximum size of cached outputs in megabytes, default is 256")
+    parser.add_argument("--workers", type=int, default=4, metavar="N",
+                        help="number of render threads, default is 4")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="print status messages to stdout", default=False)
+    parser.add_argument("-d", "--debug", action="store_true",
+                        help="print status and debug messages to stdout", default=False)
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    if(args.debug):
+        logging.basicConfig(format='%(message)s', level=logging.DEBUG)
+    elif(args.verbose):
+        logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+    warm_up()
+
+    RenderHandler.cache = RenderCache(args.cache_size * 1024 * 1024)
+    RenderHandler.executor = ThreadPoolExecutor(max_workers=args.workers,
+                                                thread_name_prefix="papr-render",
+                                                initializer=warm_up_worker)
+    logging.info("warming up %s render threads...", args.workers)
+    start_workers(RenderHandler.executor, args.workers)
+    # requests are parsed in their own threads and rendered on the workers
+    server = ThreadingHTTPServer((args.host, args.port), RenderHandler)
+    print("Serving papr on http://%s:%s/render with %s render threads"
+          % (args.host, args.port, args.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        RenderHandler.executor.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
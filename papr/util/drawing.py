@@ -1,66 +1,291 @@
 import os
+import math
 import logging
+import multiprocessing
 
 import cairo
+import gi
+gi.require_version('Pango', '1.0')
+gi.require_version('PangoCairo', '1.0')
 from gi.repository import Pango
 from gi.repository import PangoCairo
 from contextlib import contextmanager
 
+from papr.util import metrics
+from papr.util import png
 
-def create_surface(filename, width, height):
+# default resolution of raster (PNG) output
+DEFAULT_DPI = 300
+
+# resolution of rasterized elements (e.g. transparency effects) in PDF output
+PDF_FALLBACK_DPI = 1200
+
+# pixel rows of raster output rendered at once, the image surface of a band
+# takes width * TILE_ROWS * 4 bytes regardless of the paper size
+TILE_ROWS = 256
+
+
+def create_surface(target, width, height, fmt=None, fallback_dpi=PDF_FALLBACK_DPI):
     """
-    Create a Cairo surface based on the output file extension.
+    Create a Cairo vector surface based on the output format.
 
     Supports:
     - .pdf: PDFSurface (default)
     - .svg: SVGSurface
 
-    Both surfaces use the same coordinate system (points) and produce
-    visually identical output for the same drawing commands.
+    PDF and SVG surfaces use the same coordinate system (points) and produce
+    visually identical output for the same drawing commands. PNG output is
+    rendered by Document.write() in bands, see render_band().
 
     Args:
-        filename: Output file path (format detected from extension)
+        target: Output file path or writable binary file object
         width: Surface width in points
         height: Surface height in points
+        fmt: Output format ('pdf' or 'svg'), detected from the file
+            extension of `target` if omitted
+        fallback_dpi: Resolution of rasterized elements in PDF output
 
     Returns:
         A Cairo surface (PDFSurface or SVGSurface)
     """
-    ext = os.path.splitext(filename)[1].lower()
+    if fmt is None:
+        fmt = output_format(target)
 
-    if ext == '.svg':
-        logging.debug("Creating SVG surface: %s", filename)
-        surface = cairo.SVGSurface(filename, width, height)
+    if fmt == 'svg':
+        logging.debug("Creating SVG surface: %s", target)
+        surface = cairo.SVGSurface(target, width, height)
         # Set document unit to points for consistency with PDF
         # This ensures dimensions in the SVG match PDF coordinates exactly
         surface.set_document_unit(cairo.SVGUnit.PT)
         return surface
     else:
         # Default to PDF for .pdf or any other extension
-        logging.debug("Creating PDF surface: %s", filename)
-        surface = cairo.PDFSurface(filename, width, height)
+        logging.debug("Creating PDF surface: %s", target)
+        surface = cairo.PDFSurface(target, width, height)
         # Set fallback resolution to 1200 DPI for high-quality printing
         # This affects any rasterized elements (e.g., transparency effects)
         # Vector elements (text, lines, shapes) are resolution-independent
-        surface.set_fallback_resolution(1200.0, 1200.0)
-        logging.debug("PDF fallback resolution set to 1200 DPI for high-quality printing")
+        surface.set_fallback_resolution(fallback_dpi, fallback_dpi)
+        logging.debug("PDF fallback resolution set to %s DPI", fallback_dpi)
         return surface
 
 
-def create_layout_with_kerning(cr):
-    """Create a Pango layout with proper OpenType font features enabled (kerning, ligatures)."""
-    layout = PangoCairo.create_layout(cr)
+def is_path(target):
+    """Whether `target` is a file path (str or os.PathLike) rather than a file object."""
+    return isinstance(target, (str, os.PathLike))
+
+
+def output_format(target):
+    """Detect the output format from a file path, file objects default to 'pdf'."""
+    if is_path(target):
+        ext = os.path.splitext(os.fspath(target))[1].lower()
+        if ext in ('.svg', '.png'):
+            return ext[1:]
+    return 'pdf'
+
+
+class Document(object):
+    """
+    A calendar drawn once into recording surfaces, one per page.
+
+    Layouts draw into the contexts returned by new_page(). The recorded pages
+    can then be replayed into any number of output surfaces with write(), so
+    text shaping and geometry work happen once regardless of the number of
+    output formats. `stats` holds counters of the render, filled in by
+    papr.draw(). Draft documents rasterize PDF fallbacks at the output
+    resolution instead of PDF_FALLBACK_DPI.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.pages = []
+        self.stats = {}
+        self.draft = False
+
+    def new_page(self):
+        """Start a new page and return a Cairo context drawing into it."""
+        page = cairo.RecordingSurface(cairo.Content.COLOR_ALPHA,
+                                      cairo.Rectangle(0, 0, self.width, self.height))
+        self.pages.append(page)
+        return cairo.Context(page)
+
+    def write(self, target, fmt=None, dpi=DEFAULT_DPI, grayscale=False, tile_rows=TILE_ROWS, tile_jobs=1):
+        """
+        Replay all recorded pages into an output surface and finish it.
+
+        Surfaces are finished explicitly, so errors writing the output (e.g.
+        a full disk or a closed pipe) are raised here instead of getting
+        lost when the surface is garbage collected. File objects are
+        flushed but not closed.
+
+        PDF output holds all pages. SVG and PNG hold a single page, documents
+        with several pages are written to numbered files next to `target`
+        (cal.svg -> cal-1.svg, cal-2.svg, ...).
+
+        Args:
+            target: Output file path or writable binary file object
+            fmt: Output format, detected from the file extension if omitted
+            dpi: Resolution of raster (PNG) output
+            grayscale: Write raster output as 8 bit grayscale
+            tile_rows: Pixel rows of raster output rendered at once, bounds
+                the memory of raster output
+            tile_jobs: Number of processes rendering raster bands in parallel
+
+        Raises:
+            ValueError: when writing several SVG or PNG pages to a file object
+            cairo.Error, OSError: when the output can't be written
+        """
+        if fmt is None:
+            fmt = output_format(target)
+        if is_path(target):
+            target = os.fspath(target)
+
+        if fmt == 'png' and len(self.pages) == 1:
+            self._write_png(target, self.pages[0], dpi, grayscale, tile_rows, tile_jobs)
+            return
+        if fmt == 'pdf' or len(self.pages) == 1:
+            self._write(target, self.pages, fmt, dpi)
+            return
+
+        if not is_path(target):
+            raise ValueError("writing %s pages as %s needs a file path, not a file object"
+                             % (len(self.pages), fmt))
+        root, ext = os.path.splitext(target)
+        for number, page in enumerate(self.pages, 1):
+            path = "%s-%s%s" % (root, number, ext)
+            if fmt == 'png':
+                self._write_png(path, page, dpi, grayscale, tile_rows, tile_jobs)
+            else:
+                self._write(path, [page], fmt, dpi)
+
+    def _write(self, target, pages, fmt, dpi):
+        fallback_dpi = dpi if self.draft else PDF_FALLBACK_DPI
+        surface = create_surface(target, self.width, self.height, fmt, fallback_dpi)
+        try:
+            cr = cairo.Context(surface)
+            for page in pages:
+                cr.set_source_surface(page, 0, 0)
+                cr.paint()
+                cr.show_page()
+        finally:
+            # writes the remaining output and closes files cairo opened,
+            # raises write errors
+            surface.finish()
+        if not is_path(target):
+            target.flush()
+
+    def _write_png(self, target, page, dpi, grayscale, tile_rows, tile_jobs):
+        """Replay `page` band by band and stream the rows into a PNG encoder."""
+        scale = dpi / metrics.INCH
+        width = int(math.ceil(self.width * scale))
+        height = int(math.ceil(self.height * scale))
+        bands = [(top, min(tile_rows, height - top)) for top in range(0, height, tile_rows)]
+        logging.debug("Rendering %sx%s PNG at %s DPI in %s band(s) of %s rows: %s",
+                      width, height, dpi, len(bands), tile_rows, target)
+
+        writer = png.PNGWriter(target, width, height, grayscale)
+        try:
+            self._write_bands(writer, page, width, height, scale, bands, grayscale, tile_jobs)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
 
-    # Enable OpenType font features for better typography
-    # kern=1: enable kerning
-    # liga=1: enable standard ligatures
+    def _write_bands(self, writer, page, width, height, scale, bands, grayscale, tile_jobs):
+        if tile_jobs > 1 and len(bands) > 1 and "fork" in multiprocessing.get_all_start_methods():
+            # workers inherit the recorded page by forking, only band
+            # numbers and compressed rows pass between the processes
+            job = (page, width, scale, grayscale, bands[-1][0])
+            context = multiprocessing.get_context("fork")
+            with context.Pool(tile_jobs, initializer=_init_band_worker, initargs=(job,)) as pool:
+                writer.write_parts(pool.imap(_compress_band, bands), height)
+        else:
+            for top, rows in bands:
+                surface = render_band(page, width, top, rows, scale)
+                writer.write_rows(surface.get_data(), surface.get_stride(), rows)
+                surface.finish()
+
+
+def render_band(page, width, top, rows, scale):
+    """
+    Replay the pixel rows [top, top + rows) of the recorded `page` at
+    `scale` into a new white RGB24 image surface of `width` x `rows` pixels.
+    """
+    surface = cairo.ImageSurface(cairo.Format.RGB24, width, rows)
+    cr = cairo.Context(surface)
+    # white paper instead of transparent background
+    cr.set_source_rgb(1, 1, 1)
+    cr.paint()
+    cr.translate(0, -top)
+    cr.rectangle(0, top, width, rows)
+    cr.clip()
+    cr.scale(scale, scale)
+    cr.set_source_surface(page, 0, 0)
+    cr.paint()
+    surface.flush()
+    return surface
+
+
+# state of a band worker process, set once after forking
+_band_job = None
+
+
+def _init_band_worker(job):
+    global _band_job
+    _band_job = job
+
+
+def _compress_band(band):
+    page, width, scale, grayscale, last_top = _band_job
+    top, rows = band
+    surface = render_band(page, width, top, rows, scale)
+    scanlines = png.encode_rows(surface.get_data(), surface.get_stride(), rows, width, grayscale)
+    surface.finish()
+    return png.compress_part(scanlines, top == last_top)
+
+
+def page_starts(year, month, months, months_per_page):
+    """
+    Return the (year, month) each page of a document starts with.
+
+    Args:
+        year: Year of the first month
+        month: First month (1-12)
+        months: Number of consecutive months to cover, None for one page
+        months_per_page: Number of months a page of the layout shows
+    """
+    pages = 1 if months is None else max(1, int(math.ceil(months / float(months_per_page))))
+    starts = []
+    for page in range(pages):
+        index = (month - 1) + page * months_per_page
+        starts.append((year + index // 12, index % 12 + 1))
+    return starts
+
+
+# OpenType font features for better typography
+# kern=1: enable kerning
+# liga=1: enable standard ligatures
+FONT_FEATURES = "kern=1,liga=1"
+
+# draft renders skip kerning and ligatures
+DRAFT_FONT_FEATURES = "kern=0,liga=0"
+
+
+def font_features_attributes(features=FONT_FEATURES):
+    """Create a Pango attribute list applying OpenType `features` to the entire text."""
     attr_list = Pango.AttrList()
-    font_features = Pango.attr_font_features_new("kern=1,liga=1")
+    font_features = Pango.attr_font_features_new(features)
     font_features.start_index = 0
     font_features.end_index = 0xFFFFFFFF  # Apply to entire text (max uint32)
     attr_list.insert(font_features)
-    layout.set_attributes(attr_list)
+    return attr_list
+
 
+def create_layout_with_kerning(cr):
+    """Create a Pango layout with proper OpenType font features enabled (kerning, ligatures)."""
+    layout = PangoCairo.create_layout(cr)
+    layout.set_attributes(font_features_attributes())
     return layout
 
 
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Calendar geometry, separated from drawing.
+Layouts compute the cells of a page in a single pass into a compact,
+array-backed model (date ordinals, x/y/width/height, weekend/month-start
+flags) which the drawing stage then consumes. A model only depends on the
+page dimensions, the margin and the dates, so it is cached per layout,
+paper, margin, year and month and shared across fonts, locales and output
+formats.
+"""
+
+import array
+import collections
+import datetime
+import functools
+
+# flags of a cell
+WEEKEND = 1
+MONTH_START = 2
+WEEK_START = 4
+
+# number of page models kept per layout
+CACHE_SIZE = 256
+
+# every cached geometry function, see clear_caches()
+_cached = []
+
+Cell = collections.namedtuple(
+    "Cell", "date x y width height weekend month_start week_start")
+
+
+class Cells(object):
+    """
+    Compact list of cells, one entry per date, stored column-wise in arrays.
+    Models are shared through the cache and must not be modified once built.
+    """
+
+    __slots__ = ("ordinals", "x", "y", "width", "height", "flags")
+
+    def __init__(self):
+        self.ordinals = array.array('l')
+        self.x = array.array('d')
+        self.y = array.array('d')
+        self.width = array.array('d')
+        self.height = array.array('d')
+        self.flags = array.array('B')
+
+    def append(self, date, x, y, width, height):
+        """Add the cell of `date` at the given position."""
+        flags = 0
+        if date.isoweekday() >= 6:
+            flags |= WEEKEND
+        if date.day == 1:
+            flags |= MONTH_START
+        if date.weekday() == 0:
+            flags |= WEEK_START
+        self.ordinals.append(date.toordinal())
+        self.x.append(x)
+        self.y.append(y)
+        self.width.append(width)
+        self.height.append(height)
+        self.flags.append(flags)
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def __getitem__(self, index):
+        flags = self.flags[index]
+        return Cell(datetime.date.fromordinal(self.ordinals[index]),
+                    self.x[index], self.y[index],
+                    self.width[index], self.height[index],
+                    bool(flags & WEEKEND), bool(flags & MONTH_START),
+                    bool(flags & WEEK_START))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def rects(self, flag=None):
+        """
+        Return the (x, y, width, height) of all cells.
+
+        Args:
+            flag: Only return the cells with this flag set, e.g. WEEKEND
+        """
+        return [(self.x[i], self.y[i], self.width[i], self.height[i])
+                for i in range(len(self))
+                if flag is None or self.flags[i] & flag]
+
+
+# cells holds the days of a page, labels the boxes of titles such as month
+# names or year numbers, dated by the first day they label
+Page = collections.namedtuple("Page", "cells labels")
+
+
+def page():
+    """Return an empty page model."""
+    return Page(Cells(), Cells())
+
+
+def cached(function):
+    """
+    Cache the page models computed by a layout geometry function, which
+    takes the page dimensions, margin and dates as hashable arguments.
+    """
+    wrapper = functools.lru_cache(maxsize=CACHE_SIZE)(function)
+    _cached.append(wrapper)
+    return wrapper
+
+
+def clear_caches():
+    """Empty the caches of all geometry functions, e.g. to time cold renders."""
+    for function in _cached:
+        function.cache_clear()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Static cell chrome (weekend shading, cell borders, rules).
+Layouts collect the cells of a page and draw the chrome once as a single
+path per style, instead of a fill and a stroke per cell. Grid lines shared
+by neighbouring cells are emitted once. Per-day text is drawn on top
+afterwards.
+"""
+
+import collections
+
+import cairo
+
+from papr.util import drawing
+
+# coordinates closer than this are considered the same grid line
+PRECISION = 4
+EPSILON = 10 ** -PRECISION
+
+
+def fill_cells(cr, cells, color):
+    """Fill all cell rectangles (x, y, width, height) as one path."""
+    if not cells:
+        return
+    with drawing.restoring_transform(cr):
+        cr.new_path()
+        for x, y, width, height in cells:
+            cr.rectangle(x, y, width, height)
+        cr.set_source_rgba(*color, 1.0)
+        cr.fill()
+
+
+def merge_intervals(intervals):
+    """Merge overlapping or touching (start, end) intervals, returned sorted."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + EPSILON:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def grid_segments(cells):
+    """
+    Decompose cell rectangles (x, y, width, height) into the line segments
+    of their borders. Every edge shared by neighbouring cells is returned
+    once and collinear edges are merged into one segment.
+    """
+    horizontal = collections.defaultdict(list)
+    vertical = collections.defaultdict(list)
+    for x, y, width, height in cells:
+        horizontal[round(y, PRECISION)].append((x, x + width))
+        horizontal[round(y + height, PRECISION)].append((x, x + width))
+        vertical[round(x, PRECISION)].append((y, y + height))
+        vertical[round(x + width, PRECISION)].append((y, y + height))
+
+    segments = []
+    for y in sorted(horizontal):
+        for x0, x1 in merge_intervals(horizontal[y]):
+            segments.append((x0, y, x1, y))
+    for x in sorted(vertical):
+        for y0, y1 in merge_intervals(vertical[x]):
+            segments.append((x, y0, x, y1))
+    return segments
+
+
+def stroke_grid(cr, cells, color, line_width):
+    """
+    Stroke the borders of all cell rectangles (x, y, width, height) as one
+    path, emitting every grid line only once.
+    """
+    if not cells:
+        return
+    with drawing.restoring_transform(cr):
+        # square caps close the outer corners like the joins of a rectangle
+        cr.set_line_cap(cairo.LineCap.SQUARE)
+        stroke_segments(cr, grid_segments(cells), color, line_width)
+
+
+def stroke_segments(cr, segments, color, line_width):
+    """Stroke all line segments (x0, y0, x1, y1) as one path."""
+    if not segments:
+        return
+    with drawing.restoring_transform(cr):
+        cr.new_path()
+        for x0, y0, x1, y1 in segments:
+            cr.move_to(x0, y0)
+            cr.line_to(x1, y1)
+        cr.set_source_rgba(*color, 1.0)
+        cr.set_line_width(line_width)
+        cr.stroke()
+
+
+class ChromeCache(object):
+    """
+    Records static page chrome once per key into a recording surface and
+    stamps it onto every page with the same key, so multi-page documents
+    share the grid (one PDF XObject) instead of drawing it per page.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self._surfaces = {}
+
+    def draw(self, cr, key, draw_chrome):
+        """
+        Stamp the chrome recorded for `key` onto `cr`.
+
+        Args:
+            cr: Cairo context to draw into
+            key: Hashable description of the chrome, e.g. its cells
+            draw_chrome: Function drawing the chrome into a given context,
+                called only the first time `key` is seen
+        """
+        surface = self._surfaces.get(key)
+        if surface is None:
+            surface = cairo.RecordingSurface(cairo.Content.COLOR_ALPHA,
+                                             cairo.Rectangle(0, 0, self.width, self.height))
+            draw_chrome(cairo.Context(surface))
+            self._surfaces[key] = surface
+        with drawing.restoring_transform(cr):
+            cr.set_source_surface(surface, 0, 0)
+            cr.paint()
+
+
+def draw_cells(cr, cells, weekends, weekend_color, border_color, line_width):
+    """Fill the weekend cells and stroke the grid of all cells."""
+    fill_cells(cr, weekends, weekend_color)
+    stroke_grid(cr, cells, border_color, line_width)
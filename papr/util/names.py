@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Month and weekday names of a locale.
+The tables are built once per locale and cached, layouts look names up
+through `env.names` instead of calling strftime per cell, which depends on
+the process-wide locale. One process can render several locales.
+"""
+
+import datetime
+import functools
+import locale
+import threading
+
+# 2001-01-01 is a Monday, so day n of that week has weekday() n - 1
+MONDAY = datetime.date(2001, 1, 1)
+
+# serializes the short locale switch while a table is built
+_lock = threading.Lock()
+
+
+class Names(object):
+    """
+    Weekday and month names of one locale in full and abbreviated width,
+    each as written by the locale and uppercased.
+    """
+
+    def __init__(self, locale_name, weekdays, weekdays_abbr, months, months_abbr):
+        self.locale = locale_name
+        self._weekdays = {
+            (False, False): tuple(weekdays),
+            (True, False): tuple(weekdays_abbr),
+            (False, True): tuple(name.upper() for name in weekdays),
+            (True, True): tuple(name.upper() for name in weekdays_abbr),
+        }
+        self._months = {
+            (False, False): tuple(months),
+            (True, False): tuple(months_abbr),
+            (False, True): tuple(name.upper() for name in months),
+            (True, True): tuple(name.upper() for name in months_abbr),
+        }
+
+    def weekday(self, date, abbreviated=False, upper=False):
+        """Name of the weekday of `date`, like strftime("%A") or "%a"."""
+        return self._weekdays[abbreviated, upper][date.weekday()]
+
+    def month(self, date, abbreviated=False, upper=False):
+        """Name of the month of `date`, like strftime("%B") or "%b"."""
+        return self._months[abbreviated, upper][date.month - 1]
+
+    def months(self, abbreviated=False, upper=False):
+        """All twelve month names, January first, e.g. to fit one size for all of them."""
+        return self._months[abbreviated, upper]
+
+
+@functools.lru_cache(maxsize=None)
+def for_locale(locale_name):
+    """
+    Return the names of `locale_name`, e.g. 'de_DE'.
+
+    The locale's LC_TIME is switched on only while the table is built and
+    restored afterwards, so rendering never depends on the global locale.
+
+    Raises:
+        locale.Error: if the locale is not installed
+    """
+    with _lock:
+        previous = locale.setlocale(locale.LC_TIME)
+        try:
+            locale.setlocale(locale.LC_TIME, locale_name)
+            week = [MONDAY + datetime.timedelta(days=day) for day in range(7)]
+            year = [datetime.date(2001, month, 1) for month in range(1, 13)]
+            return Names(locale_name,
+                         [date.strftime("%A") for date in week],
+                         [date.strftime("%a") for date in week],
+                         [date.strftime("%B") for date in year],
+                         [date.strftime("%b") for date in year])
+        finally:
+            locale.setlocale(locale.LC_TIME, previous)
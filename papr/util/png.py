@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Minimal streaming PNG encoder for Cairo RGB24 image data.
+Rows are compressed as they arrive, so an image can be written band by band
+without ever holding the whole encoded file or pixel buffer in memory. Bands
+can also be compressed independently (in parallel) and joined.
+"""
+
+import os
+import sys
+import zlib
+import struct
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+COLOR_TYPE_GRAY = 0
+COLOR_TYPE_RGB = 2
+
+# byte offsets of the red, green and blue channel in a native-endian
+# Cairo RGB24 pixel (32 bit xRGB)
+if sys.byteorder == "little":
+    RED, GREEN, BLUE = 2, 1, 0
+else:
+    RED, GREEN, BLUE = 1, 2, 3
+
+
+class PNGWriter(object):
+    """
+    Write Cairo RGB24 rows as an 8 bit RGB or grayscale PNG.
+
+    Args:
+        target: Output file path or writable binary file object
+        width: Image width in pixels
+        height: Image height in pixels
+        grayscale: Write a single 8 bit gray channel instead of RGB. All
+            layouts only draw in grays, so the green channel is used as gray
+            value; colored content is reduced to its green channel.
+    """
+
+    def __init__(self, target, width, height, grayscale=False):
+        if isinstance(target, (str, os.PathLike)):
+            self.file = open(target, "wb")
+            self.owns_file = True
+        else:
+            self.file = target
+            self.owns_file = False
+        self.width = width
+        self.height = height
+        self.grayscale = grayscale
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(6)
+
+        color_type = COLOR_TYPE_GRAY if grayscale else COLOR_TYPE_RGB
+        self.file.write(PNG_SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def write_rows(self, data, stride, rows):
+        """
+        Encode `rows` rows of Cairo RGB24 pixel data.
+
+        Args:
+            data: Buffer with the pixel data, e.g. ImageSurface.get_data()
+            stride: Bytes per row in `data`
+            rows: Number of rows to take from the start of `data`
+        """
+        scanlines = encode_rows(data, stride, rows, self.width, self.grayscale)
+        compressed = self.compressor.compress(scanlines)
+        if compressed:
+            self._chunk(b"IDAT", compressed)
+        self.rows_written += rows
+
+    def write_parts(self, parts, rows):
+        """
+        Write `rows` rows from parts compressed independently, e.g. by
+        several processes, see compress_part(). Replaces write_rows(), the
+        parts form the complete image data.
+
+        Args:
+            parts: Iterable of compress_part() results, in row order
+            rows: Number of rows the parts hold together
+        """
+        # zlib header of a deflate stream with the default window
+        self._chunk(b"IDAT", b"\x78\x9c")
+        checksum = 1
+        for compressed, part_checksum, length in parts:
+            self._chunk(b"IDAT", compressed)
+            checksum = adler32_combine(checksum, part_checksum, length)
+        self._chunk(b"IDAT", struct.pack(">I", checksum))
+        self.rows_written += rows
+        self.compressor = None
+
+    def close(self):
+        """Flush the compressed stream and finish the file."""
+        if self.rows_written != self.height:
+            raise ValueError("PNG expects %s rows, got %s" % (self.height, self.rows_written))
+        if self.compressor is not None:
+            self._chunk(b"IDAT", self.compressor.flush())
+        self._chunk(b"IEND", b"")
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def abort(self):
+        """Stop writing after an error, closing the file if the writer opened it."""
+        if self.owns_file:
+            self.file.close()
+
+
+def encode_rows(data, stride, rows, width, grayscale=False):
+    """Return `rows` rows of Cairo RGB24 pixel data as PNG scanlines (filter type None)."""
+    data = memoryview(data)
+    channels = 1 if grayscale else 3
+    scanlines = bytearray((width * channels + 1) * rows)
+    for row in range(rows):
+        start = row * stride
+        pixels = data[start:start + width * 4]
+        offset = row * (width * channels + 1)
+        # filter type 0 (None) for every scanline
+        scanlines[offset] = 0
+        offset += 1
+        if grayscale:
+            scanlines[offset:offset + width] = pixels[GREEN::4]
+        else:
+            scanlines[offset:offset + width * 3:3] = pixels[RED::4]
+            scanlines[offset + 1:offset + width * 3:3] = pixels[GREEN::4]
+            scanlines[offset + 2:offset + width * 3:3] = pixels[BLUE::4]
+    return bytes(scanlines)
+
+
+def compress_part(scanlines, last):
+    """
+    Compress `scanlines` into a raw deflate part which can be concatenated
+    with the parts of the neighbouring rows, like pigz does.
+
+    Args:
+        scanlines: Encoded rows, see encode_rows()
+        last: Whether the part holds the last rows of the image
+
+    Returns:
+        (compressed data, adler32 checksum of `scanlines`, length of `scanlines`)
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    compressed = compressor.compress(scanlines)
+    compressed += compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return compressed, zlib.adler32(scanlines), len(scanlines)
+
+
+ADLER_BASE = 65521
+
+
+def adler32_combine(adler1, adler2, length2):
+    """Adler-32 of two concatenated buffers from their checksums, as zlib's adler32_combine()."""
+    remainder = length2 % ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (remainder * sum1) % ADLER_BASE
+    sum1 += (adler2 & 0xFFFF) + ADLER_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xFFFF) + ((adler2 >> 16) & 0xFFFF) + ADLER_BASE - remainder
+    sum1 %= ADLER_BASE
+    sum2 %= ADLER_BASE
+    return sum1 | (sum2 << 16)
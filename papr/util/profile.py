@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Per-phase timing of a render, enabled with --profile.
+Phases nest (e.g. render/geometry inside render) and are reported with
+their total and self time. The functions of the layout module are timed
+as well, inclusive of the functions they call. A Profiler follows a single
+render in a single thread.
+"""
+
+import time
+import json
+import inspect
+import functools
+import collections
+from contextlib import contextmanager, nullcontext
+
+
+class Profiler(object):
+    """Collects call counts and wall times of phases and functions."""
+
+    def __init__(self):
+        # path of nested phase names -> [calls, seconds]
+        self.phases = collections.OrderedDict()
+        # function name -> [calls, seconds]
+        self.functions = collections.OrderedDict()
+        self._stack = []
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as phase `name`, nested in the current phase."""
+        # re-entering the current phase, e.g. measuring text while a layout
+        # is shown, counts towards the outer block only
+        if self._stack and self._stack[-1] == name:
+            yield
+            return
+
+        self._stack.append(name)
+        # registered before running, so phases are reported in start order
+        entry = self.phases.setdefault(tuple(self._stack), [0, 0.0])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+            self._stack.pop()
+
+    def timed(self, function, name, phase=None):
+        """Return `function` wrapped to record its calls as `name`, optionally inside `phase`."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                if phase is None:
+                    return function(*args, **kwargs)
+                with self.phase(phase):
+                    return function(*args, **kwargs)
+            finally:
+                entry = self.functions.setdefault(name, [0, 0.0])
+                entry[0] += 1
+                entry[1] += time.perf_counter() - start
+        return wrapper
+
+    def timed_context(self, manager, phase):
+        """Return the context manager function `manager` wrapped to run inside `phase`."""
+        @contextmanager
+        def wrapper(*args, **kwargs):
+            with self.phase(phase):
+                with manager(*args, **kwargs) as value:
+                    yield value
+        return wrapper
+
+    @contextmanager
+    def instrument(self, module, phases=None):
+        """
+        Time every function defined in `module` while the block runs.
+
+        Calls between the module's functions are looked up in the module
+        globals, so they go through the wrappers too. The original
+        functions are restored on exit.
+
+        Args:
+            module: Module whose functions are timed, e.g. a layout
+            phases: dict of name suffix to phase, e.g. {"Geometry": "geometry"}
+        """
+        prefix = module.__name__.rsplit(".", 1)[-1]
+        originals = {}
+        for name, function in inspect.getmembers(module, callable):
+            # functions defined in the module, including lru_cached ones
+            if inspect.isclass(function) or getattr(function, "__module__", None) != module.__name__:
+                continue
+            phase = None
+            for suffix, candidate in (phases or {}).items():
+                if name.endswith(suffix):
+                    phase = candidate
+            originals[name] = function
+            setattr(module, name, self.timed(function, "%s.%s" % (prefix, name), phase))
+        try:
+            yield
+        finally:
+            for name, function in originals.items():
+                setattr(module, name, function)
+
+    def report(self):
+        """Return the collected timings as a JSON serializable dict."""
+        phases = []
+        for path, (calls, total) in self.phases.items():
+            children = sum(child_total for child, (_, child_total) in self.phases.items()
+                           if len(child) == len(path) + 1 and child[:len(path)] == path)
+            phases.append({
+                "phase": "/".join(path),
+                "calls": calls,
+                "total": total,
+                "self": total - children,
+            })
+        functions = [{"function": name, "calls": calls, "total": total}
+                     for name, (calls, total) in sorted(self.functions.items(),
+                                                         key=lambda item: -item[1][1])]
+        return {
+            "total": sum(total for path, (_, total) in self.phases.items() if len(path) == 1),
+            "phases": phases,
+            "functions": functions,
+        }
+
+    def json(self):
+        return json.dumps(self.report(), indent=2)
+
+    def table(self):
+        """Return the collected timings as a printable summary table."""
+        report = self.report()
+        lines = ["%-36s %8s %12s %12s" % ("phase", "calls", "total ms", "self ms")]
+        for phase in report["phases"]:
+            depth = phase["phase"].count("/")
+            name = "  " * depth + phase["phase"].rsplit("/", 1)[-1]
+            lines.append("%-36s %8d %12.1f %12.1f" % (
+                name, phase["calls"], phase["total"] * 1000, phase["self"] * 1000))
+        lines.append("%-36s %8s %12.1f" % ("total", "", report["total"] * 1000))
+        lines.append("")
+        lines.append("%-36s %8s %12s" % ("function (inclusive)", "calls", "total ms"))
+        for function in report["functions"]:
+            lines.append("%-36s %8d %12.1f" % (
+                function["function"], function["calls"], function["total"] * 1000))
+        return "\n".join(lines)
+
+
+def phase(profiler, name):
+    """profiler.phase(name), or a no-op when not profiling (`profiler` is None)."""
+    if profiler is None:
+        return nullcontext()
+    return profiler.phase(name)
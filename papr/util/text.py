@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Text measurement helpers shared by all layouts.
+Caches are created per render (see papr.setup) and hang off the environment.
+"""
+
+import collections
+from contextlib import contextmanager
+
+import cairo
+import gi
+gi.require_version('Pango', '1.0')
+gi.require_version('PangoCairo', '1.0')
+from gi.repository import Pango
+from gi.repository import PangoCairo
+
+from papr.util import drawing
+
+
+# Pixel rectangle as returned by Pango.Layout.get_pixel_extents()
+Rect = collections.namedtuple("Rect", "x y width height")
+
+
+class MeasureCache(object):
+    """
+    Memoizes Pango text measurements keyed by (font description, text, features).
+
+    Every distinct string is shaped once per render, repeated measurements
+    are served from the cache. `hits` and `misses` count lookups, `created`
+    the Pango layouts allocated for measuring.
+    """
+
+    def __init__(self, features=drawing.FONT_FEATURES):
+        self.features = features
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self._extents = {}
+        self._layout = None
+
+    def _measuring_layout(self, cr):
+        if self._layout is None:
+            context = PangoCairo.create_context(cr)
+            # measure untransformed, independent of the current cairo matrix
+            context.set_matrix(None)
+            self._layout = Pango.Layout.new(context)
+            self._layout.set_attributes(drawing.font_features_attributes(self.features))
+            self.created += 1
+        return self._layout
+
+    def extents(self, cr, font, text):
+        """Return the (ink, logical) pixel extents of `text` set in `font`."""
+        key = (font.to_string(), text, self.features)
+        try:
+            result = self._extents[key]
+            self.hits += 1
+            return result
+        except KeyError:
+            self.misses += 1
+
+        layout = self._measuring_layout(cr)
+        layout.set_font_description(font)
+        layout.set_text(text, -1)
+        ink_rect, logical_rect = layout.get_pixel_extents()
+        result = (Rect(ink_rect.x, ink_rect.y, ink_rect.width, ink_rect.height),
+                  Rect(logical_rect.x, logical_rect.y, logical_rect.width, logical_rect.height))
+        self._extents[key] = result
+        return result
+
+    def size(self, cr, font, text):
+        """Return the (width, height) logical pixel size, like Pango.Layout.get_pixel_size()."""
+        logical = self.extents(cr, font, text)[1]
+        return logical.width, logical.height
+
+
+class LayoutPool(object):
+    """
+    Hands out reusable Pango layouts for drawing text.
+
+    All layouts share one Pango context and one prebuilt attribute list with
+    the OpenType `features`; a draw only updates text and font. Layouts are
+    returned to the pool after being shown, `created` counts the layouts
+    actually allocated.
+    """
+
+    def __init__(self, features=drawing.FONT_FEATURES):
+        self.features = features
+        self.created = 0
+        self._context = None
+        self._attributes = None
+        self._free = []
+
+    @contextmanager
+    def layout(self, cr):
+        """Context manager like drawing.layout(), showing the layout at the current point on exit."""
+        if self._context is None:
+            self._context = PangoCairo.create_context(cr)
+            self._attributes = drawing.font_features_attributes(self.features)
+
+        if self._free:
+            layout = self._free.pop()
+        else:
+            layout = Pango.Layout.new(self._context)
+            layout.set_attributes(self._attributes)
+            self.created += 1
+
+        try:
+            yield layout
+            # sync the shared context with the matrix and target of `cr`
+            PangoCairo.update_layout(cr, layout)
+            PangoCairo.show_layout(cr, layout)
+        finally:
+            self._free.append(layout)
+
+
+class FontRegistry(object):
+    """
+    Hands out shared Pango.FontDescription objects for the body and heading font.
+
+    Descriptions are parsed once per (family, style, size) and shared by all
+    cells, they must not be modified by callers.
+    """
+
+    def __init__(self, font, heading=None):
+        self.font = font
+        self.heading = heading or font
+        self._descriptions = {}
+
+    def get(self, size, style="", heading=False):
+        """
+        Return the font description for `size` points.
+
+        Args:
+            size: Font size in points
+            style: Pango style words, e.g. "bold" or "heavy"
+            heading: Use the heading font instead of the body font
+        """
+        family = self.heading if heading else self.font
+        key = (family, style, size)
+        try:
+            return self._descriptions[key]
+        except KeyError:
+            pass
+        if style:
+            description = Pango.FontDescription("%s %s %s" % (family, style, size))
+        else:
+            description = Pango.FontDescription("%s %s" % (family, size))
+        self._descriptions[key] = description
+        return description
+
+
+class TextFitter(object):
+    """
+    Finds the largest font size at which text fits into a box.
+
+    Sizes are binary searched between a minimum and a maximum using the
+    cached measurements of `measure`, so a search shapes each candidate
+    size once. A group of strings, e.g. all month names of the locale, is
+    solved in the same search, every string must fit at the returned size.
+    Results are memoized, repeated fits of the same box are free.
+    """
+
+    def __init__(self, measure, font_registry):
+        self.measure = measure
+        self.font_registry = font_registry
+        self._sizes = {}
+
+    def fits(self, cr, font, texts, width, height=None, ink=False):
+        """Whether every string of `texts` set in `font` fits into width x height."""
+        for text in texts:
+            ink_rect, logical_rect = self.measure.extents(cr, font, text)
+            rect = ink_rect if ink else logical_rect
+            if rect.width > width or (height is not None and rect.height > height):
+                return False
+        return True
+
+    def size(self, cr, texts, width, height=None, maximum=20, minimum=1,
+             style="", heading=False, ink=False):
+        """
+        Return the largest integer font size from `minimum` to `maximum` at
+        which all of `texts` fit, `minimum` if none does. `maximum` wins
+        over `minimum`, the size never exceeds it.
+
+        Args:
+            cr: Cairo context
+            texts: A string, or several strings sharing one size
+            width: Width of the box
+            height: Height of the box, None to fit the width only
+            maximum: Largest font size in points to consider
+            minimum: Smallest font size in points to return, unless
+                `maximum` is smaller
+            style: Pango style words, e.g. "bold", see FontRegistry.get()
+            heading: Use the heading font instead of the body font
+            ink: Fit the ink extents instead of the logical extents
+        """
+        texts = (texts,) if isinstance(texts, str) else tuple(texts)
+        key = (texts, width, height, maximum, minimum, style, heading, ink)
+        try:
+            return self._sizes[key]
+        except KeyError:
+            pass
+
+        # the size fits from `low` down, not above `high`
+        low, high = min(minimum, maximum), maximum
+        while low < high:
+            middle = (low + high + 1) // 2
+            font = self.font_registry.get(middle, style, heading)
+            if self.fits(cr, font, texts, width, height, ink):
+                low = middle
+            else:
+                high = middle - 1
+
+        self._sizes[key] = low
+        return low
+
+    def font(self, cr, texts, width, height=None, maximum=20, minimum=1,
+             style="", heading=False, ink=False):
+        """Like size(), returning the font description of the fitting size."""
+        size = self.size(cr, texts, width, height, maximum, minimum, style, heading, ink)
+        return self.font_registry.get(size, style, heading)
+
+
+class StampCache(object):
+    """
+    Shapes and records each distinct (font, text, color) once.
+
+    A stamp is a recording surface holding the drawn text. Repeated strings
+    are placed with set_source_surface()/paint() of the same stamp, so cairo
+    can emit a shared PDF XObject or SVG <use> reference instead of shaping
+    and emitting the glyph run again. `hits` and `misses` count lookups.
+    """
+
+    def __init__(self, layout_pool, measure):
+        self.layout_pool = layout_pool
+        self.measure = measure
+        self.hits = 0
+        self.misses = 0
+        self._stamps = {}
+
+    def stamp(self, cr, font, text, color):
+        """Return the recording surface of `text`, with the layout origin at (0, 0)."""
+        key = (font.to_string(), text, tuple(color), self.layout_pool.features)
+        try:
+            surface = self._stamps[key]
+            self.hits += 1
+            return surface
+        except KeyError:
+            self.misses += 1
+
+        # bounds covering ink and logical extents, with one pixel of slack
+        # for antialiasing
+        ink, logical = self.measure.extents(cr, font, text)
+        x0 = min(ink.x, logical.x) - 1
+        y0 = min(ink.y, logical.y) - 1
+        x1 = max(ink.x + ink.width, logical.x + logical.width) + 1
+        y1 = max(ink.y + ink.height, logical.y + logical.height) + 1
+
+        surface = cairo.RecordingSurface(cairo.Content.COLOR_ALPHA,
+                                         cairo.Rectangle(x0, y0, x1 - x0, y1 - y0))
+        stamp_cr = cairo.Context(surface)
+        stamp_cr.move_to(0, 0)
+        with self.layout_pool.layout(stamp_cr) as layout:
+            layout.set_font_description(font)
+            layout.set_text(text, -1)
+            stamp_cr.set_source_rgb(*color)
+
+        self._stamps[key] = surface
+        return surface
+
+    def draw(self, cr, x, y, font, text, color):
+        """Draw `text` with its layout origin at (x, y), like show_layout() at the current point."""
+        cr.set_source_surface(self.stamp(cr, font, text, color), x, y)
+        cr.paint()